@@ -0,0 +1,216 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+# Префиксы ключей в общем кэше
+GENERATION_KEY_PREFIX = "gen"
+TIMESTAMP_KEY_PREFIX = "modified"
+RESPONSE_KEY_PREFIX = "response"
+STATS_KEY_PREFIX = "stats"
+
+
+def get_cache():
+    """Кэш API (по умолчанию локальная память или файлы)."""
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def generation_key(name):
+    return f"{GENERATION_KEY_PREFIX}:{name}"
+
+
+def new_generation():
+    """Начальное значение поколения.
+
+    Берется от времени, чтобы после вытеснения ключа из кэша поколение
+    не повторило уже использованное значение.
+    """
+    return time.time_ns()
+
+
+def get_generations(*names):
+    """Получить текущие поколения одним обращением к кэшу."""
+    cache = get_cache()
+    keys = [generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, new_generation(), None)
+            values[key] = cache.get(key)
+    return tuple(values[key] for key in keys)
+
+
+def bump_generation(*names):
+    """Сменить поколения, сделав недействительными зависящие ключи."""
+    cache = get_cache()
+    for name in names:
+        key = generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_generation(), None)
+
+
+def timestamp_key(name):
+    return f"{TIMESTAMP_KEY_PREFIX}:{name}"
+
+
+def get_timestamps(*names):
+    """Получить моменты последних изменений (UNIX-время).
+
+    Если отметки еще нет, она создается текущим временем: после
+    вытеснения из кэша клиенты один раз получат полный ответ.
+    """
+    cache = get_cache()
+    keys = [timestamp_key(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time(), None)
+            values[key] = cache.get(key)
+    return tuple(values[key] for key in keys)
+
+
+def touch_timestamps(*names):
+    """Отметить изменение данных текущим временем."""
+    now = time.time()
+    get_cache().set_many(
+        {timestamp_key(name): now for name in names}, None
+    )
+
+
+def record_stat(name):
+    """Увеличить общий для всех процессов счетчик."""
+    cache = get_cache()
+    key = f"{STATS_KEY_PREFIX}:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def get_stats(*names):
+    """Значения счетчиков по именам."""
+    keys = {f"{STATS_KEY_PREFIX}:{name}": name for name in names}
+    values = get_cache().get_many(list(keys))
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def normalize_query(query_params):
+    """Привести параметры запроса к каноническому виду.
+
+    Ключи и значения сортируются, повторы значений отбрасываются:
+    ?tags=b&tags=a и ?tags=a&tags=b дают одну и ту же выдачу.
+    """
+    return "&".join(
+        f"{key}={value}"
+        for key in sorted(query_params)
+        for value in sorted(set(query_params.getlist(key)))
+    )
+
+
+def make_response_key(request, *parts):
+    """Ключ ответа с учетом хоста: в ответе есть абсолютные ссылки."""
+    raw = "|".join(
+        [request.scheme, request.get_host(), *map(str, parts)]
+    )
+    return (
+        f"{RESPONSE_KEY_PREFIX}:"
+        f"{hashlib.md5(raw.encode('utf-8')).hexdigest()}"
+    )
+
+
+def cache_stream(chunks, key):
+    """Отдавать части ответа и сохранить его в кэш, если он не больше
+    API_CACHE_MAX_CONTENT_SIZE байт."""
+    content = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if content is not None:
+            size += len(chunk)
+            if size <= settings.API_CACHE_MAX_CONTENT_SIZE:
+                content.append(chunk)
+            else:
+                content = None
+        yield chunk
+    if content is not None:
+        get_cache().set(key, b"".join(content), settings.API_CACHE_TIMEOUT)
+
+
+class AnonymousRecipeCacheMixin:
+    """Кэширование ответов list/retrieve рецептов для анонимных запросов.
+
+    Список зависит от поколений recipes, tags и ingredients, детальная
+    страница — от поколения конкретного рецепта. Поколение автора
+    хранится вместе с ответом и сверяется при чтении, поэтому смена
+    профиля автора сбрасывает только его рецепты.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        key = make_response_key(
+            request,
+            "list",
+            *get_generations("recipes", "tags", "ingredients"),
+            normalize_query(request.query_params),
+        )
+        data = get_cache().get(key)
+        if data is not None:
+            return self.cache_hit(data)
+        response = super().list(request, *args, **kwargs)
+        self.cache_miss(key, response, response.data)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        key = make_response_key(
+            request,
+            "detail",
+            pk,
+            *get_generations(f"recipe:{pk}", "tags", "ingredients"),
+        )
+        cached = get_cache().get(key)
+        if cached is not None:
+            author_id, author_generation, data = cached
+            if get_generations(f"author:{author_id}") == (
+                author_generation,
+            ):
+                return self.cache_hit(data)
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == 200:
+            author_id = response.data["author"]["id"]
+            (author_generation,) = get_generations(f"author:{author_id}")
+            self.cache_miss(
+                key, response, (author_id, author_generation, response.data)
+            )
+        return response
+
+    def is_cacheable(self, request):
+        return settings.API_CACHE_TIMEOUT and request.user.is_anonymous
+
+    def cache_hit(self, data):
+        record_stat("recipes_cache_hits")
+        return Response(data, headers={"X-Cache": "HIT"})
+
+    def cache_miss(self, key, response, value):
+        record_stat("recipes_cache_misses")
+        response["X-Cache"] = "MISS"
+        if response.status_code == 200:
+            get_cache().set(key, value, settings.API_CACHE_TIMEOUT)
+
+
+def recipes_cache_stats():
+    """Счетчики попаданий и промахов кэша ответов рецептов."""
+    return get_stats("recipes_cache_hits", "recipes_cache_misses")
+
+
+def shopping_list_cache_stats():
+    """Счетчики попаданий и промахов кэша файлов списка покупок."""
+    return get_stats("shopping_list_cache_hits", "shopping_list_cache_misses")
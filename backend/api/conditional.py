@@ -0,0 +1,161 @@
+import hashlib
+from calendar import timegm
+from datetime import datetime, timezone
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_timestamps, normalize_query
+
+
+def from_timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def make_etag(*parts):
+    """Сильный валидатор из значений, от которых зависит ответ."""
+    raw = "|".join(map(str, parts))
+    return quote_etag(hashlib.md5(raw.encode("utf-8")).hexdigest())
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы (If-None-Match/If-Modified-Since) для
+    list/retrieve.
+
+    Валидаторы считаются до формирования тела ответа, поэтому ответ 304
+    обходится без сериализации.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_validators(request),
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.conditional_response(
+            self.get_detail_validators(request, pk),
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def get_list_validators(self, request):
+        """Вернуть пару (etag, last_modified) для списка; (None, None) —
+        без условной обработки."""
+        return None, None
+
+    def get_detail_validators(self, request, pk):
+        """Вернуть пару (etag, last_modified) для объекта; (None, None) —
+        без условной обработки."""
+        return None, None
+
+    def conditional_response(self, validators, handler, request, *args,
+                             **kwargs):
+        etag, last_modified = validators
+        last_modified = last_modified and timegm(
+            last_modified.utctimetuple()
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+            if etag:
+                response["ETag"] = etag
+        return response
+
+
+class ReferenceConditionalGetMixin(ConditionalGetMixin):
+    """Валидаторы справочника по отметке времени его последнего
+    изменения: ответ 304 не требует запросов к БД."""
+
+    timestamp_name = None
+
+    def get_list_validators(self, request):
+        (modified,) = get_timestamps(self.timestamp_name)
+        return (
+            make_etag(modified, normalize_query(request.query_params)),
+            from_timestamp(modified),
+        )
+
+    def get_detail_validators(self, request, pk):
+        (modified,) = get_timestamps(self.timestamp_name)
+        return make_etag(modified, pk), from_timestamp(modified)
+
+
+class RecipeConditionalGetMixin(ConditionalGetMixin):
+    """Валидаторы рецептов по версиям строк (updated_at).
+
+    Для списка берется максимум updated_at и количество рецептов по
+    отфильтрованной выборке, а также время последнего удаления рецепта.
+    Для авторизованного пользователя учитывается время изменения его
+    избранного, корзины и подписок.
+    """
+
+    def get_user_timestamps(self, request):
+        if request.user.is_anonymous:
+            return ()
+        return get_timestamps(f"user:{request.user.pk}")
+
+    def get_list_validators(self, request):
+        versions = self.filter_queryset(
+            self.queryset.model.objects.all()
+        ).aggregate(last_updated=Max("updated_at"), total=Count("pk"))
+        modified = max(
+            filter(
+                None,
+                (
+                    versions["last_updated"],
+                    *map(
+                        from_timestamp,
+                        get_timestamps("recipes_deleted")
+                        + self.get_user_timestamps(request),
+                    ),
+                ),
+            )
+        )
+        return (
+            make_etag(
+                modified.isoformat(),
+                versions["total"],
+                request.user.pk,
+                request.get_host(),
+                normalize_query(request.query_params),
+            ),
+            modified,
+        )
+
+    def get_detail_validators(self, request, pk):
+        try:
+            updated_at = (
+                self.queryset.model.objects.filter(pk=pk)
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except (ValueError, TypeError):
+            # Нечисловой id: ответ 404 вернет get_object
+            return None, None
+        if updated_at is None:
+            return None, None
+        modified = max(
+            (
+                updated_at,
+                *map(from_timestamp, self.get_user_timestamps(request)),
+            )
+        )
+        return (
+            make_etag(
+                modified.isoformat(), pk, request.user.pk, request.get_host()
+            ),
+            modified,
+        )
@@ -1,2 +1,17 @@
 # Количество результатов на странице
 PAGE_SIZE_DEFAULT = 6
+
+# Размер пачки строк при потоковой выгрузке списка покупок
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+# Наибольшее число рецептов в одном пакетном запросе
+BULK_RECIPES_MAX = 100
+
+# Наибольший размер страницы ленты подписок
+TIMELINE_MAX_PAGE_SIZE = 100
+
+# Наибольшее число результатов нечеткого поиска ингредиентов
+FUZZY_SEARCH_LIMIT = 20
+
+# Наименьшее сходство триграмм для нечеткого поиска (как в pg_trgm)
+FUZZY_SIMILARITY_THRESHOLD = 0.3
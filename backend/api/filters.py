@@ -1,6 +1,14 @@
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes import search
+from recipes.models import Ingredient, Recipe
+
+from .reference_cache import tag_cache
+
+
+def tag_choices():
+    """Слаги тегов из кэша справочника."""
+    return [(tag.slug, tag.name) for tag in tag_cache.all()]
 
 
 class IngredientFilter(filters.FilterSet):
@@ -16,11 +24,11 @@ class IngredientFilter(filters.FilterSet):
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов."""
 
-    tags = filters.ModelMultipleChoiceFilter(
+    tags = filters.MultipleChoiceFilter(
         field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
+        choices=tag_choices,
     )
+    search = filters.CharFilter(method="filter_search")
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
@@ -28,7 +36,13 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ["tags", "author", "is_favorited", "is_in_shopping_cart"]
+        fields = [
+            "tags", "author", "search", "is_favorited", "is_in_shopping_cart"
+        ]
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, ингредиентам и описанию."""
+        return search.search_recipes(queryset, value)
 
     def filter_is_favorited(self, queryset, name, value):
         """Фильтр по избранному."""
@@ -0,0 +1,216 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework.response import Response
+
+from recipes.models import Ingredient
+
+from .cache import get_generations
+from .constants import FUZZY_SEARCH_LIMIT, FUZZY_SIMILARITY_THRESHOLD
+from .reference_cache import ingredient_cache
+
+# Символ больше любого символа в названии: верхняя граница диапазона
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+# Слова, из которых берутся триграммы (как в pg_trgm)
+TRIGRAM_WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(value):
+    """Множество триграмм строки по правилам pg_trgm.
+
+    Каждое слово дополняется двумя пробелами в начале и одним в конце.
+    """
+    result = set()
+    for word in TRIGRAM_WORD_RE.findall(value.casefold()):
+        padded = f"  {word} "
+        result.update(
+            padded[start:start + 3] for start in range(len(padded) - 2)
+        )
+    return result
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по префиксу.
+
+    Названия приводятся к casefold и хранятся в отсортированном массиве,
+    поиск делается двумя бинарными поисками. Индекс перестраивается при
+    смене поколения каталога ingredients, а в режиме ранжирования по
+    популярности еще и по истечении INGREDIENT_INDEX_MAX_AGE секунд.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.built_at = 0
+        self.prefix_index = ((), (), ())
+        self.trigram_index = ((), (), {}, ())
+        self.stats = Counter()
+
+    def is_stale(self, version):
+        if version != self.version:
+            return True
+        return (
+            settings.INGREDIENT_INDEX_RANK_BY_USAGE
+            and time.monotonic() - self.built_at
+            > settings.INGREDIENT_INDEX_MAX_AGE
+        )
+
+    def ensure_fresh(self):
+        (version,) = get_generations("ingredients")
+        if not self.is_stale(version):
+            self.stats["hits"] += 1
+            return
+        with self.lock:
+            if self.is_stale(version):
+                self.stats["misses"] += 1
+                self.build(version)
+            else:
+                self.stats["hits"] += 1
+
+    def build(self, version):
+        if settings.INGREDIENT_INDEX_RANK_BY_USAGE:
+            rows = (
+                Ingredient.objects.order_by()
+                .annotate(usage=Count("recipe_ingredients"))
+                .values_list("id", "name", "measurement_unit", "usage")
+            )
+        else:
+            rows = (
+                (obj.pk, obj.name, obj.measurement_unit, 0)
+                for obj in ingredient_cache.all()
+            )
+        entries = sorted(
+            (name.casefold(), name, measurement_unit, pk, usage)
+            for pk, name, measurement_unit, usage in rows
+        )
+        keys = tuple(entry[0] for entry in entries)
+        items = tuple(
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, name, measurement_unit, pk, _ in entries
+        )
+        usage = tuple(entry[4] for entry in entries)
+        postings = {}
+        trigram_counts = []
+        for position, key in enumerate(keys):
+            key_trigrams = trigrams(key)
+            trigram_counts.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                postings.setdefault(trigram, []).append(position)
+        # Одним кортежем, чтобы параллельный поиск не увидел смесь версий
+        self.prefix_index = (keys, items, usage)
+        self.trigram_index = (keys, items, postings, tuple(trigram_counts))
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def search(self, prefix):
+        """Ингредиенты, название которых начинается с prefix."""
+        self.ensure_fresh()
+        key = prefix.casefold()
+        keys, items, usage = self.prefix_index
+        start = bisect_left(keys, key)
+        end = bisect_left(keys, key + PREFIX_UPPER_BOUND, start)
+        if not settings.INGREDIENT_INDEX_RANK_BY_USAGE:
+            return list(items[start:end])
+        positions = sorted(
+            range(start, end), key=lambda position: -usage[position]
+        )
+        return [items[position] for position in positions]
+
+    def fuzzy_search(self, query, limit=FUZZY_SEARCH_LIMIT):
+        """Ингредиенты, похожие на query, не больше limit.
+
+        Сначала идут совпадения по префиксу, затем остальные по убыванию
+        сходства триграмм (как similarity в pg_trgm) не ниже
+        FUZZY_SIMILARITY_THRESHOLD. Общие триграммы считаются по
+        инвертированному индексу, так что просматриваются только
+        названия, имеющие с запросом хотя бы одну триграмму.
+        """
+        result = self.search(query)[:limit]
+        query_trigrams = trigrams(query)
+        if len(result) == limit or not query_trigrams:
+            return result
+        keys, items, postings, trigram_counts = self.trigram_index
+        key = query.casefold()
+        shared = {}
+        for trigram in query_trigrams:
+            for position in postings.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_trigrams) + trigram_counts[position] - count
+            )
+            if (
+                similarity >= FUZZY_SIMILARITY_THRESHOLD
+                and not keys[position].startswith(key)
+            ):
+                scored.append((-similarity, position))
+        result.extend(
+            items[position]
+            for _, position in heapq.nsmallest(limit - len(result), scored)
+        )
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def fuzzy_search_postgresql(query, limit=FUZZY_SEARCH_LIMIT):
+    """Нечеткий поиск ингредиентов через pg_trgm и GIN-индекс."""
+    similarity = RawSQL(
+        "similarity(recipes_ingredient.name, %s)", (query,)
+    )
+    return list(
+        Ingredient.objects.filter(
+            Q(name__istartswith=query)
+            | Q(
+                pk__in=RawSQL(
+                    "SELECT id FROM recipes_ingredient WHERE name %% %s",
+                    (query,),
+                )
+            )
+        )
+        .annotate(
+            is_prefix=Case(
+                When(name__istartswith=query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            similarity=similarity,
+        )
+        .order_by("-is_prefix", "-similarity", "name")
+        .values("id", "name", "measurement_unit")[:limit]
+    )
+
+
+class IngredientPrefixSearchMixin:
+    """Отдавать ?name=... из индекса в памяти.
+
+    ?name=...&fuzzy=1 включает поиск с опечатками: в PostgreSQL через
+    pg_trgm, в остальных СУБД через триграммный индекс в памяти.
+    Запросы с другими параметрами идут в БД через IngredientFilter.
+    """
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        name = params.get("name")
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        if set(params) == {"name"}:
+            return Response(ingredient_index.search(name))
+        if set(params) == {"name", "fuzzy"} and params["fuzzy"] in (
+            "1", "true", "True"
+        ):
+            if connection.vendor == "postgresql":
+                return Response(fuzzy_search_postgresql(name))
+            return Response(ingredient_index.fuzzy_search(name))
+        return super().list(request, *args, **kwargs)
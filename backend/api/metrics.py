@@ -0,0 +1,389 @@
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from .cache import recipes_cache_stats, shopping_list_cache_stats
+from .ingredient_index import ingredient_index
+from .reference_cache import ingredient_cache, tag_cache
+
+# Границы корзин гистограмм: секунды, число запросов к БД, байты
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Тип, описание и корзины метрик
+METRICS = {
+    "foodgram_requests_total": (
+        "counter", "Запросы по представлению, действию и статусу", None,
+    ),
+    "foodgram_request_duration_seconds": (
+        "histogram", "Время обработки запроса", LATENCY_BUCKETS,
+    ),
+    "foodgram_request_db_queries": (
+        "histogram", "Число запросов к БД за запрос", QUERY_BUCKETS,
+    ),
+    "foodgram_db_duration_seconds_total": (
+        "counter", "Суммарное время запросов к БД", None,
+    ),
+    "foodgram_response_size_bytes": (
+        "histogram", "Размер тела ответа", SIZE_BUCKETS,
+    ),
+    "foodgram_cache_requests_total": (
+        "counter", "Обращения к кэшам по результату", None,
+    ),
+    "foodgram_cache_hit_ratio": (
+        "gauge", "Доля попаданий в кэш", None,
+    ),
+}
+
+# Кэши в памяти процесса; их счетчики пишутся в файл воркера
+PROCESS_CACHES = {
+    "tags": tag_cache,
+    "ingredients": ingredient_cache,
+    "ingredient_index": ingredient_index,
+}
+
+# Кэши с общими для всех процессов счетчиками hits и misses
+SHARED_CACHES = {
+    "recipes": recipes_cache_stats,
+    "shopping_list": shopping_list_cache_stats,
+}
+
+# Результаты обращений, которые считаются попаданием; остальные — промахи
+HIT_RESULTS = ("hits", "local_hits", "shared_hits")
+
+# Файлы метрик: воркеров (<pid>-<метка>) и завершившихся воркеров
+WORKER_FILE_PATTERN = "worker-*.json"
+RETIRED_FILE = "retired.json"
+LOCK_FILE = "metrics.lock"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsStore:
+    """Метрики процесса с периодическим сбросом в файл.
+
+    Каждый воркер пишет свой файл METRICS_DIR/worker-<pid>-<метка>.json
+    не чаще раза в METRICS_FLUSH_INTERVAL секунд (запись атомарная,
+    через замену файла), а /metrics складывает файлы всех воркеров.
+    Случайная метка не дает новому процессу с тем же pid затереть файл
+    старого. Файлы завершившихся воркеров переносятся в retired.json,
+    чтобы счетчики не убывали.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex[:8]
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed = time.monotonic()
+
+    def check_fork(self):
+        # После fork в мастере gunicorn воркер не наследует его метрики
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.check_fork()
+            self.counters[(name, labels_key(labels))] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self.lock:
+            self.check_fork()
+            key = (name, labels_key(labels))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    "counts": [0] * (len(buckets) + 1),
+                    "sum": 0.0,
+                }
+            histogram["counts"][bisect.bisect_left(buckets, value)] += 1
+            histogram["sum"] += value
+
+    def snapshot(self):
+        counters = dict(self.counters)
+        for cache_name, cache in PROCESS_CACHES.items():
+            for result, value in cache.stats.items():
+                labels = {"cache": cache_name, "result": result}
+                counters[
+                    ("foodgram_cache_requests_total", labels_key(labels))
+                ] = value
+        return {
+            "counters": [
+                [name, dict(labels), value]
+                for (name, labels), value in counters.items()
+            ],
+            "histograms": [
+                [name, dict(labels), histogram["counts"], histogram["sum"]]
+                for (name, labels), histogram in self.histograms.items()
+            ],
+        }
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not force and now - self.flushed < interval:
+            return
+        with self.lock:
+            self.check_fork()
+            self.flushed = now
+            data = self.snapshot()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        write_json(
+            os.path.join(
+                settings.METRICS_DIR, f"worker-{self.pid}-{self.token}.json"
+            ),
+            data,
+        )
+
+
+def write_json(path, data):
+    """Записать файл атомарно, через замену."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def read_json(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(data, counters, histograms):
+    """Добавить метрики файла к сумме."""
+    for name, labels, value in data["counters"]:
+        counters[(name, labels_key(labels))] += value
+    for name, labels, counts, total in data["histograms"]:
+        key = (name, labels_key(labels))
+        if key not in histograms:
+            histograms[key] = [[0] * len(counts), 0.0]
+        merged = histograms[key]
+        merged[0] = [a + b for a, b in zip(merged[0], counts)]
+        merged[1] += total
+
+
+def retire_dead_workers():
+    """Перенести метрики завершившихся воркеров в retired.json.
+
+    Файлы воркеров, процессов которых больше нет, складываются в общий
+    файл и удаляются, поэтому каталог не растет с перезапусками, а
+    счетчики не убывают. Перенос идет под блокировкой файла, чтобы
+    параллельный /metrics не учел один файл дважды.
+    """
+    directory = settings.METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [
+            path
+            for path in glob.glob(os.path.join(directory, WORKER_FILE_PATTERN))
+            if not is_alive(int(os.path.basename(path).split("-")[1]))
+        ]
+        if not dead:
+            return
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        counters = defaultdict(float)
+        histograms = {}
+        for path in [retired_path, *dead]:
+            data = read_json(path)
+            if data is not None:
+                merge(data, counters, histograms)
+        write_json(
+            retired_path,
+            {
+                "counters": [
+                    [name, dict(labels), value]
+                    for (name, labels), value in counters.items()
+                ],
+                "histograms": [
+                    [name, dict(labels), counts, total]
+                    for (name, labels), (counts, total) in histograms.items()
+                ],
+            },
+        )
+        for path in dead:
+            os.remove(path)
+
+
+store = MetricsStore()
+
+
+def observe_request(request, response, timings, total):
+    """Учесть запрос; вызывается из PerformanceMiddleware."""
+    from .performance import view_label
+
+    view, action = view_label(request) or ("unresolved", "")
+    labels = {"view": view, "action": action}
+    store.inc(
+        "foodgram_requests_total",
+        {
+            **labels,
+            "method": request.method,
+            "status": str(response.status_code),
+        },
+    )
+    store.observe("foodgram_request_duration_seconds", labels, total)
+    store.observe("foodgram_request_db_queries", labels, timings.queries)
+    store.inc(
+        "foodgram_db_duration_seconds_total",
+        labels,
+        timings.durations["db"],
+    )
+    if response.has_header("Content-Length"):
+        size = int(response["Content-Length"])
+    elif not response.streaming:
+        size = len(response.content)
+    else:
+        size = None
+    if size is not None:
+        store.observe("foodgram_response_size_bytes", labels, size)
+    store.flush()
+
+
+def collect():
+    """Сложить метрики всех воркеров из файлов METRICS_DIR."""
+    store.flush(force=True)
+    retire_dead_workers()
+    counters = defaultdict(float)
+    histograms = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+        data = read_json(path)
+        if data is not None:
+            merge(data, counters, histograms)
+    # Счетчики этих кэшей уже общие для всех процессов
+    for cache_name, get_cache_stats in SHARED_CACHES.items():
+        stats = get_cache_stats()
+        for result in ("hits", "misses"):
+            labels = labels_key({"cache": cache_name, "result": result})
+            counters[("foodgram_cache_requests_total", labels)] = stats[
+                f"{cache_name}_cache_{result}"
+            ]
+    return counters, histograms
+
+
+def hit_ratios(counters):
+    hits, requests = defaultdict(float), defaultdict(float)
+    for (name, labels), value in counters.items():
+        if name != "foodgram_cache_requests_total":
+            continue
+        labels = dict(labels)
+        requests[labels["cache"]] += value
+        if labels["result"] in HIT_RESULTS:
+            hits[labels["cache"]] += value
+    return {
+        (
+            "foodgram_cache_hit_ratio",
+            labels_key({"cache": cache}),
+        ): hits[cache] / total
+        for cache, total in requests.items()
+        if total
+    }
+
+
+def escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(counters, histograms):
+    """Метрики в текстовом формате Prometheus."""
+    series = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append(
+            f"{name}{format_labels(labels)} {format_value(value)}"
+        )
+    for (name, labels), (counts, total) in sorted(histograms.items()):
+        cumulative = 0
+        bounds = METRICS[name][2] + ("+Inf",)
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            le = labels + (("le", bound),)
+            series[name].append(
+                f"{name}_bucket{format_labels(le)} {cumulative}"
+            )
+        series[name].append(
+            f"{name}_sum{format_labels(labels)} {format_value(total)}"
+        )
+        series[name].append(
+            f"{name}_count{format_labels(labels)} {cumulative}"
+        )
+    lines = []
+    for name, (kind, help_text, _) in METRICS.items():
+        if not series[name]:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(series[name])
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Метрики для Prometheus; доступны с адресов METRICS_ALLOWED_IPS."""
+    address = request.META.get("REMOTE_ADDR")
+    if (
+        not settings.METRICS_ENABLED
+        or address not in settings.METRICS_ALLOWED_IPS
+    ):
+        raise Http404
+    counters, histograms = collect()
+    counters.update(hit_ratios(counters))
+    return HttpResponse(
+        render(counters, histograms), content_type=CONTENT_TYPE
+    )
+
+
+@atexit.register
+def flush_at_exit():
+    if store.counters or store.histograms:
+        store.flush(force=True)
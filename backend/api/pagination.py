@@ -1,8 +1,140 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+from base64 import b64decode, b64encode
 
-from .constants import PAGE_SIZE_DEFAULT
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, CursorPagination, PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .constants import PAGE_SIZE_DEFAULT, TIMELINE_MAX_PAGE_SIZE
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = PAGE_SIZE_DEFAULT
     page_size_query_param = "limit"
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация рецептов по ключу (-pub_date, -id)."""
+
+    page_size = PAGE_SIZE_DEFAULT
+    page_size_query_param = "limit"
+    ordering = ("-pub_date", "-id")
+
+
+class FollowCursorPagination(RecipeCursorPagination):
+    """Курсорная пагинация подписок в порядке их оформления."""
+
+    ordering = ("-id",)
+
+
+class PageOrCursorPagination(LimitPageNumberPagination):
+    """Пагинация page/limit с переходом на курсор по параметру ?cursor=.
+
+    Курсорный режим не считает COUNT(*) и не сканирует OFFSET, поэтому
+    глубокие страницы отдаются за постоянное время.
+    """
+
+    cursor_query_param = "cursor"
+    cursor_pagination_class = RecipeCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
+
+
+class SubscriptionPagination(PageOrCursorPagination):
+    """Пагинация подписок с опциональным курсорным режимом."""
+
+    cursor_pagination_class = FollowCursorPagination
+
+
+class TimelinePagination(BasePagination):
+    """Keyset-пагинация ленты по ключу (pub_date, recipe_id).
+
+    Курсор — последний ключ страницы, следующая страница начинается
+    строго после него. Источник ключей передается в paginate_timeline
+    функцией fetch(before, size).
+    """
+
+    page_size = PAGE_SIZE_DEFAULT
+    page_size_query_param = "limit"
+    max_page_size = TIMELINE_MAX_PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор"
+
+    def paginate_timeline(self, fetch, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        keys = fetch(self.decode_cursor(request), page_size + 1)
+        self.next_key = keys[page_size - 1] if len(keys) > page_size else None
+        return keys[:page_size]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            pub_date, pk = (
+                b64decode(encoded.encode("ascii"), altchars=b"-_")
+                .decode("ascii")
+                .split("|")
+            )
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None:
+                raise ValueError(encoded)
+            return pub_date, int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, key):
+        pub_date, pk = key
+        encoded = b64encode(
+            f"{pub_date.isoformat()}|{pk}".encode("ascii"), altchars=b"-_"
+        ).decode("ascii")
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encoded,
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": (
+                    self.encode_cursor(self.next_key)
+                    if self.next_key is not None
+                    else None
+                ),
+                "results": data,
+            }
+        )
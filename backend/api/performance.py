@@ -0,0 +1,333 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.utils.text import slugify
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .metrics import observe_request
+
+logger = logging.getLogger("foodgram.performance")
+
+state = threading.local()
+
+# Порядок метрик в Server-Timing и в строке лога
+TIMING_NAMES = ("db", "view", "serializer", "image", "render")
+
+
+class RequestTimings:
+    """Замеры одного запроса, секунды."""
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.durations = defaultdict(float)
+        self.depth = Counter()
+        self.view_started = self.view_finished = None
+        self.render_started = None
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(state, "timings", None)
+
+
+@contextmanager
+def timed(name):
+    """Добавить время блока к метрике name текущего запроса.
+
+    Вложенные блоки с тем же именем не считаются повторно: вложенный
+    сериализатор входит во время внешнего.
+    """
+    timings = current()
+    if timings is None or timings.depth[name]:
+        yield
+        return
+    timings.depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - started
+        timings.depth[name] -= 1
+
+
+def timed_function(name, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with timed(name):
+            return function(*args, **kwargs)
+
+    wrapper.timed = True
+    return wrapper
+
+
+@contextmanager
+def untimed():
+    """Не учитывать запросы блока: служебные запросы самих замеров,
+    например EXPLAIN журнала медленных запросов."""
+    state.untimed = True
+    try:
+        yield
+    finally:
+        state.untimed = False
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Считать запросы к базе и их время."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings = current()
+        if timings is not None and not getattr(state, "untimed", False):
+            timings.queries += 1
+            timings.durations["db"] += time.perf_counter() - started
+
+
+def install():
+    """Обернуть валидацию и вывод сериализаторов DRF и разбор картинок.
+
+    Вызывается, только когда замеры включены, поэтому без них классы
+    остаются нетронутыми.
+    """
+    from drf_extra_fields.fields import Base64ImageField
+    from rest_framework import serializers
+
+    if getattr(serializers.BaseSerializer.is_valid, "timed", False):
+        return
+    for cls in (serializers.BaseSerializer, serializers.ListSerializer):
+        cls.is_valid = timed_function("serializer", cls.is_valid)
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = property(timed_function("serializer", cls.data.fget))
+    Base64ImageField.to_internal_value = timed_function(
+        "image", Base64ImageField.to_internal_value
+    )
+
+
+def view_label(request):
+    """Класс представления и действие DRF запроса, например
+    ("RecipeViewSet", "list"), или None, если адрес не разрешен."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    view = getattr(match.func, "cls", None) or getattr(
+        match.func, "view_class", None
+    )
+    if view is None:
+        return match.func.__module__, match.func.__name__
+    actions = getattr(match.func, "actions", None) or {}
+    return view.__name__, actions.get(request.method.lower(), "dispatch")
+
+
+def is_staff_request(request):
+    """Сделан ли запрос сотрудником, по аутентификации DRF.
+
+    Промежуточный слой стоит первым, и пользователь к этому моменту еще
+    не определен, поэтому учетные данные проверяются заранее. Стоит это
+    обычно один запрос к БД и только для запросов с заголовком профиля.
+    """
+    drf_request = Request(request)
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(drf_request)
+        except APIException:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+def start_profiler():
+    if settings.PERFORMANCE_PROFILER == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+def save_profile(profiler, request, total):
+    """Записать профиль в PERFORMANCE_PROFILE_DIR и вернуть имя файла."""
+    name = "-".join(
+        (
+            time.strftime("%Y%m%d-%H%M%S"),
+            request.method.lower(),
+            slugify(request.path)[:60] or "root",
+            f"{total * 1000:.0f}ms",
+            uuid.uuid4().hex[:6],
+        )
+    )
+    os.makedirs(settings.PERFORMANCE_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PERFORMANCE_PROFILE_DIR, name)
+    if isinstance(profiler, cProfile.Profile):
+        name += ".prof"
+        profiler.dump_stats(path + ".prof")
+    else:
+        name += ".html"
+        with open(path + ".html", "w", encoding="utf-8") as file:
+            file.write(profiler.output_html())
+    return name
+
+
+class PerformanceMiddleware:
+    """Замеры запроса: запросы к базе и их время, время представления,
+    сериализаторов, разбора картинок и рендеринга.
+
+    Замеры уходят в заголовок Server-Timing и одной JSON-строкой в лог
+    foodgram.performance. Доля PERFORMANCE_PROFILE_RATE запросов и
+    запросы сотрудников с заголовком PERFORMANCE_PROFILE_HEADER
+    профилируются целиком, профили пишутся в PERFORMANCE_PROFILE_DIR.
+    При METRICS_ENABLED замеры также передаются в метрики Prometheus,
+    а при SLOW_QUERY_LOG по ним журнал медленных запросов определяет
+    представление. Если выключено все, промежуточный слой отключается
+    при старте и ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        if not (
+            settings.PERFORMANCE_TIMING
+            or settings.METRICS_ENABLED
+            or settings.SLOW_QUERY_LOG
+        ):
+            raise MiddlewareNotUsed
+        self.timing = settings.PERFORMANCE_TIMING
+        self.get_response = get_response
+        if not self.timing:
+            return
+        if settings.PERFORMANCE_PROFILER not in ("cprofile", "pyinstrument"):
+            raise ImproperlyConfigured(
+                "PERFORMANCE_PROFILER: ожидается cprofile или pyinstrument"
+            )
+        if settings.PERFORMANCE_PROFILER == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "PERFORMANCE_PROFILER = pyinstrument, но пакет "
+                    "pyinstrument не установлен"
+                )
+        install()
+
+    def __call__(self, request):
+        # По заголовку профилируются только запросы сотрудников: иначе
+        # любой клиент мог бы включить профилировщик для своих запросов
+        requested = (
+            self.timing
+            and bool(request.headers.get(settings.PERFORMANCE_PROFILE_HEADER))
+            and is_staff_request(request)
+        )
+        timings = state.timings = RequestTimings(request)
+        sampled = (
+            self.timing
+            and random.random() < settings.PERFORMANCE_PROFILE_RATE
+        )
+        profiler = start_profiler() if requested or sampled else None
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            state.timings = None
+            if profiler is not None:
+                stop_profiler(profiler)
+        finished = time.perf_counter()
+        total = finished - timings.started
+        if timings.view_started is not None:
+            timings.durations["view"] = (
+                timings.view_finished or finished
+            ) - timings.view_started
+        profile = None
+        if profiler is not None:
+            profile = save_profile(profiler, request, total)
+        if settings.METRICS_ENABLED:
+            observe_request(request, response, timings, total)
+        if self.timing:
+            response["Server-Timing"] = self.server_timing(
+                timings, total, profile
+            )
+            self.log(request, response, timings, total, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = current()
+        if timings is not None:
+            # Ответ DRF рендерится сразу после этого вызова
+            timings.view_finished = timings.render_started = (
+                time.perf_counter()
+            )
+            response.add_post_render_callback(
+                lambda response: self.rendered(timings)
+            )
+        return response
+
+    def rendered(self, timings):
+        timings.durations["render"] = (
+            time.perf_counter() - timings.render_started
+        )
+
+    def server_timing(self, timings, total, profile):
+        metrics = [
+            f'db;dur={timings.durations["db"] * 1000:.1f};'
+            f'desc="{timings.queries} queries"'
+        ]
+        metrics += [
+            f"{name};dur={timings.durations[name] * 1000:.1f}"
+            for name in TIMING_NAMES[1:]
+            if name in timings.durations
+        ]
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        if profile is not None:
+            metrics.append(f'profile;desc="{profile}"')
+        return ", ".join(metrics)
+
+    def log(self, request, response, timings, total, profile):
+        label = view_label(request)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": label and ".".join(label),
+            "status": response.status_code,
+            "queries": timings.queries,
+            "total_ms": round(total * 1000, 2),
+        }
+        for name in TIMING_NAMES:
+            if name in timings.durations:
+                record[f"{name}_ms"] = round(
+                    timings.durations[name] * 1000, 2
+                )
+        if profile is not None:
+            record["profile"] = profile
+        logger.info(json.dumps(record, ensure_ascii=False))
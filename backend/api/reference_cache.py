@@ -0,0 +1,189 @@
+import threading
+from collections import Counter
+
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from recipes.models import Ingredient, Tag
+
+from .cache import get_cache, get_generations
+
+
+class ReferenceCache:
+    """Двухуровневый кэш справочника: словарь процесса перед общим кэшем.
+
+    Версией служит поколение справочника в общем кэше: его меняют
+    сигналы post_save/post_delete, а каждый воркер сверяет его одним
+    обращением к кэшу. При смене версии словарь процесса заполняется из
+    общего кэша, а если там пусто — одним запросом к БД.
+    """
+
+    def __init__(self, model, generation_name, lookup_fields=("pk",)):
+        self.model = model
+        self.generation_name = generation_name
+        self.lookup_fields = lookup_fields
+        self.lock = threading.Lock()
+        self.version = None
+        self.objects = []
+        self.lookups = {}
+        self.stats = Counter()
+
+    def __deepcopy__(self, memo):
+        # Поля DRF копируются вместе с аргументами, а кэш один на процесс
+        return self
+
+    def shared_key(self, version):
+        return f"reference:{self.generation_name}:{version}"
+
+    def ensure_fresh(self):
+        (version,) = get_generations(self.generation_name)
+        if version == self.version:
+            self.stats["local_hits"] += 1
+            return
+        with self.lock:
+            if version != self.version:
+                self.load(version)
+
+    def load(self, version):
+        cache = get_cache()
+        key = self.shared_key(version)
+        objects = cache.get(key)
+        if objects is None:
+            self.stats["db_loads"] += 1
+            objects = list(self.model.objects.all())
+            cache.set(key, objects, None)
+        else:
+            self.stats["shared_hits"] += 1
+        self.lookups = {
+            field: {
+                str(getattr(obj, field)): obj for obj in objects
+            }
+            for field in self.lookup_fields
+        }
+        self.objects = objects
+        self.version = version
+
+    def all(self):
+        """Все объекты справочника в порядке Meta.ordering."""
+        self.ensure_fresh()
+        return self.objects
+
+    def get(self, value, field="pk"):
+        """Объект по значению поля или None."""
+        self.ensure_fresh()
+        return self.lookups[field].get(str(value))
+
+    def get_many(self, values, field="pk"):
+        """Словарь найденных объектов по значениям поля."""
+        self.ensure_fresh()
+        lookup = self.lookups[field]
+        return {
+            value: lookup[str(value)]
+            for value in values
+            if str(value) in lookup
+        }
+
+
+tag_cache = ReferenceCache(Tag, "tags", lookup_fields=("pk", "slug"))
+ingredient_cache = ReferenceCache(Ingredient, "ingredients")
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который ищет объект в кэше справочника.
+
+    Со списком (many=True) все id ищутся одним обращением к кэшу, а
+    ошибка перечисляет все ненайденные. С resolve=False поле только
+    проверяет id: объекты разом находит вложенный список через resolve.
+    """
+
+    def __init__(self, reference_cache, resolve=True, **kwargs):
+        self.reference_cache = reference_cache
+        self.resolve_objects = resolve
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return CachedManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+    def to_internal_value(self, data):
+        pk = self.to_pk(data)
+        if not self.resolve_objects:
+            return pk
+        (obj,) = self.resolve([pk])
+        if obj is None:
+            self.fail("does_not_exist", pk_value=pk)
+        return obj
+
+    def resolve(self, pks):
+        """Объекты по списку id, None на месте ненайденных."""
+        found = self.reference_cache.get_many(pks)
+        return [found.get(pk) for pk in pks]
+
+    def does_not_exist_error(self, pk):
+        """Текст ошибки ненайденного id, как у self.fail."""
+        return self.error_messages["does_not_exist"].format(pk_value=pk)
+
+
+class CachedManyRelatedField(serializers.ManyRelatedField):
+    """Список CachedPrimaryKeyRelatedField, разрешаемый разом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        pks = [self.child_relation.to_pk(item) for item in data]
+        objects = self.child_relation.resolve(pks)
+        missing = dict.fromkeys(
+            pk for pk, obj in zip(pks, objects) if obj is None
+        )
+        if missing:
+            # По сообщению на каждый ненайденный id в одной ошибке
+            raise serializers.ValidationError(
+                [
+                    self.child_relation.does_not_exist_error(pk)
+                    for pk in missing
+                ],
+                code="does_not_exist",
+            )
+        return objects
+
+
+class ReferenceCacheViewMixin:
+    """Отдавать list/retrieve справочника из кэша без запросов к БД.
+
+    Список с параметрами фильтрации по-прежнему строится запросом к БД.
+    """
+
+    reference_cache = None
+
+    def get_queryset(self):
+        if self.request.query_params:
+            return super().get_queryset()
+        return self.reference_cache.all()
+
+    def filter_queryset(self, queryset):
+        if isinstance(queryset, list):
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = self.reference_cache.get(self.kwargs[lookup_url_kwarg])
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
@@ -2,6 +2,7 @@ from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes import shopping_list
 from recipes.constants import (
     MIN_COOKING_TIME, MIN_INGREDIENTS_COUNT, RECIPE_MAX_LENGTH,
 )
@@ -10,6 +11,11 @@ from recipes.models import (
 )
 from users.serializers import CustomUserSerializer
 
+from .constants import BULK_RECIPES_MAX
+from .reference_cache import (
+    CachedPrimaryKeyRelatedField, ingredient_cache, tag_cache,
+)
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
@@ -41,10 +47,32 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Список ингредиентов рецепта: все id ищутся в справочнике разом."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        field = self.child.fields["id"]
+        ingredients = field.resolve([item["id"] for item in items])
+        errors = [
+            {}
+            if ingredient is not None
+            else {"id": [field.does_not_exist_error(item["id"])]}
+            for item, ingredient in zip(items, ingredients)
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        for item, ingredient in zip(items, ingredients):
+            item["id"] = ingredient
+        return items
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания ингредиентов в рецепте."""
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = CachedPrimaryKeyRelatedField(
+        ingredient_cache,
+        resolve=False,
         queryset=Ingredient.objects.all(),
         error_messages={
             "required": "Укажите id ингредиента.",
@@ -66,6 +94,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ("id", "amount")
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
@@ -104,6 +133,9 @@ class RecipeListSerializer(serializers.ModelSerializer):
         if not user or user.is_anonymous:
             return False
 
+        is_favorited = getattr(obj, "is_favorited", None)
+        if is_favorited is not None:
+            return is_favorited
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
@@ -115,8 +147,18 @@ class RecipeListSerializer(serializers.ModelSerializer):
         if not user or user.is_anonymous:
             return False
 
+        is_in_shopping_cart = getattr(obj, "is_in_shopping_cart", None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
+    def to_representation(self, instance):
+        """Передать аннотированный флаг подписки в сериализатор автора."""
+        is_author_subscribed = getattr(instance, "is_author_subscribed", None)
+        if is_author_subscribed is not None:
+            instance.author.is_subscribed = is_author_subscribed
+        return super().to_representation(instance)
+
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецепта."""
@@ -130,7 +172,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             "empty": "Необходимо указать хотя бы один ингредиент.",
         },
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = CachedPrimaryKeyRelatedField(
+        tag_cache,
         queryset=Tag.objects.all(),
         many=True,
         required=True,
@@ -242,17 +285,79 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_recipe_ingredients(recipe, ingredients_data)
         return recipe
 
+    def update_recipe_tags(self, recipe, tags):
+        """Добавить и убрать только изменившиеся теги рецепта."""
+        old_ids = {tag.pk for tag in recipe.tags.all()}
+        new_ids = {tag.pk for tag in tags}
+        if old_ids - new_ids:
+            recipe.tags.remove(*(old_ids - new_ids))
+        if new_ids - old_ids:
+            recipe.tags.add(*(new_ids - old_ids))
+
+    def update_recipe_ingredients(self, recipe, ingredients_data):
+        """Привести ингредиенты рецепта к новому списку по разнице.
+
+        Новые строки создаются, изменившиеся количества обновляются, а
+        лишние строки удаляются — каждое одним запросом и только при
+        наличии изменений. Возвращает старые и новые количества по id
+        ингредиента.
+        """
+        rows = {
+            row.ingredient_id: row for row in recipe.recipe_ingredients.all()
+        }
+        old_amounts = {pk: row.amount for pk, row in rows.items()}
+        new_amounts = {
+            item["id"].pk: item["amount"] for item in ingredients_data
+        }
+        changed = []
+        for pk, amount in new_amounts.items():
+            if pk in rows and rows[pk].amount != amount:
+                rows[pk].amount = amount
+                changed.append(rows[pk])
+        removed = [pk for pk in old_amounts if pk not in new_amounts]
+        self.create_recipe_ingredients(
+            recipe,
+            [item for item in ingredients_data if item["id"].pk not in rows],
+        )
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def update(self, instance, validated_data):
         """Обновить рецепт."""
         ingredients_data = validated_data.pop("ingredients", None)
         tags = validated_data.pop("tags", None)
         if tags is not None:
-            instance.tags.set(tags)
+            self.update_recipe_tags(instance, tags)
         if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            self.create_recipe_ingredients(instance, ingredients_data)
+            shopping_list.change_recipe_ingredients(
+                instance,
+                *self.update_recipe_ingredients(instance, ingredients_data),
+            )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        # Перечитать рецепт с заготовками списка: ответ строится
+        # фиксированным числом запросов при любом числе ингредиентов
+        request = self.context.get("request")
+        instance = (
+            Recipe.objects.with_related()
+            .with_user_flags(request and request.user)
+            .get(pk=instance.pk)
+        )
         return RecipeListSerializer(instance, context=self.context).data
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX,
+    )
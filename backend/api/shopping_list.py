@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+
+# Строк текста на одной странице PDF
+PDF_LINES_PER_PAGE = 50
+
+# Размеры страницы A4 и поля в пунктах
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 11
+PDF_LEADING = 15
+
+# Глифы кириллицы для байтов cp1251 (Adobe Glyph List)
+PDF_CYRILLIC_DIFFERENCES = (
+    "/Differences [149 /bullet 151 /emdash 168 /afii10023 184 /afii10071 "
+    "185 /afii61352 192 "
+    + " ".join(
+        f"/afii{code}"
+        for code in (
+            *range(10017, 10023),
+            *range(10024, 10050),
+            *range(10065, 10071),
+            *range(10072, 10098),
+        )
+    )
+    + "]"
+)
+
+SHOPPING_LIST_TITLE = "Список покупок:"
+SHOPPING_LIST_HEADERS = ("Ингредиент", "Единица измерения", "Количество")
+
+
+def format_line(row):
+    return (
+        f"• {row['ingredient__name']} "
+        f"({row['ingredient__measurement_unit']}) — "
+        f"{row['total_amount']}"
+    )
+
+
+def render_txt(rows):
+    """Список покупок текстом, по строке на ингредиент."""
+    yield f"{SHOPPING_LIST_TITLE}\n"
+    for row in rows:
+        yield f"{format_line(row)}\n"
+
+
+def render_csv(rows):
+    """Список покупок в CSV с заголовком."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(SHOPPING_LIST_HEADERS)
+    yield flush()
+    for row in rows:
+        writer.writerow(
+            (
+                row["ingredient__name"],
+                row["ingredient__measurement_unit"],
+                row["total_amount"],
+            )
+        )
+        yield flush()
+
+
+def render_json(rows):
+    """Список покупок JSON-массивом, который пишется по элементу."""
+    separator = "["
+    for row in rows:
+        yield separator + json.dumps(
+            {
+                "name": row["ingredient__name"],
+                "measurement_unit": row["ingredient__measurement_unit"],
+                "amount": row["total_amount"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def pdf_text(value):
+    """Строка PDF в кодировке cp1251 с экранированием."""
+    encoded = value.encode("cp1251", errors="replace")
+    for char in (b"\\", b"(", b")"):
+        encoded = encoded.replace(char, b"\\" + char)
+    return b"(" + encoded + b")"
+
+
+class StreamingPDFWriter:
+    """Минимальный PDF, который отдается постранично.
+
+    Объекты пишутся по мере готовности, смещения запоминаются для
+    таблицы xref, а дерево страниц (объект 2) пишется в конце. В памяти
+    держится только текущая страница.
+    """
+
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+        self.next_number = 4
+        self.pages = []
+
+    def write(self, data):
+        self.position += len(data)
+        return data
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.position
+        return self.write(
+            b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        )
+
+    def allocate(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def header(self):
+        yield self.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        yield self.write_object(
+            self.CATALOG, b"<< /Type /Catalog /Pages 2 0 R >>"
+        )
+        yield self.write_object(
+            self.FONT,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+            b"/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding "
+            + PDF_CYRILLIC_DIFFERENCES.encode("ascii")
+            + b" >> >>",
+        )
+
+    def page(self, lines):
+        content = [
+            b"BT /F1 %d Tf %d TL %d %d Td"
+            % (
+                PDF_FONT_SIZE,
+                PDF_LEADING,
+                PDF_MARGIN,
+                PDF_PAGE_HEIGHT - PDF_MARGIN,
+            )
+        ]
+        content.extend(pdf_text(line) + b" '" for line in lines)
+        content.append(b"ET")
+        stream = b"\n".join(content)
+        content_number = self.allocate()
+        yield self.write_object(
+            content_number,
+            b"<< /Length %d >>\nstream\n" % len(stream)
+            + stream
+            + b"\nendstream",
+        )
+        page_number = self.allocate()
+        self.pages.append(page_number)
+        yield self.write_object(
+            page_number,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, content_number),
+        )
+
+    def trailer(self):
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        yield self.write_object(
+            self.PAGES,
+            b"<< /Type /Pages /Kids [" + kids
+            + b"] /Count %d >>" % len(self.pages),
+        )
+        xref_position = self.position
+        lines = [b"xref", b"0 %d" % self.next_number, b"0000000000 65535 f "]
+        lines.extend(
+            b"%010d 00000 n " % self.offsets[number]
+            for number in range(1, self.next_number)
+        )
+        yield self.write(b"\n".join(lines) + b"\n")
+        yield self.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self.next_number, xref_position)
+        )
+
+
+def render_pdf(rows):
+    """Список покупок в PDF, по странице на PDF_LINES_PER_PAGE строк."""
+    writer = StreamingPDFWriter()
+    yield from writer.header()
+    lines = [SHOPPING_LIST_TITLE, ""]
+    for row in rows:
+        lines.append(format_line(row))
+        if len(lines) == PDF_LINES_PER_PAGE:
+            yield from writer.page(lines)
+            lines = []
+    if lines:
+        yield from writer.page(lines)
+    yield from writer.trailer()
+
+
+# Формат: (рендерер, content type)
+SHOPPING_LIST_FORMATS = {
+    "txt": (render_txt, "text/plain; charset=utf-8"),
+    "csv": (render_csv, "text/csv; charset=utf-8"),
+    "json": (render_json, "application/json"),
+    "pdf": (render_pdf, "application/pdf"),
+}
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
+)
+from users.models import Follow, User
+
+from .cache import bump_generation, touch_timestamps
+
+# Поля профиля, которые попадают в ответы с рецептами
+AUTHOR_PUBLIC_FIELDS = frozenset(
+    ("email", "username", "first_name", "last_name", "avatar")
+)
+
+
+def bump_on_commit(*names):
+    """Сменить поколения после фиксации транзакции.
+
+    Иначе параллельный запрос может успеть положить в кэш старые данные
+    уже под новым поколением.
+    """
+    transaction.on_commit(lambda: bump_generation(*names))
+
+
+def touch_on_commit(*names):
+    """Отметить время изменения после фиксации транзакции."""
+    transaction.on_commit(lambda: touch_timestamps(*names))
+
+
+def touch_recipes(queryset):
+    """Обновить версию рецептов, в ответах которых изменились данные."""
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_on_commit("recipes", f"recipe:{instance.pk}")
+
+
+@receiver(post_delete, sender=Recipe)
+def touch_recipes_deleted(sender, **kwargs):
+    touch_on_commit("recipes_deleted")
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    bump_on_commit("recipes", f"recipe:{instance.recipe_id}")
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        bump_on_commit("recipes", f"recipe:{instance.pk}")
+    else:
+        bump_on_commit(
+            "recipes", *(f"recipe:{pk}" for pk in pk_set or ())
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_on_commit("tags")
+    touch_on_commit("tags")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    bump_on_commit("ingredients")
+    touch_on_commit("ingredients")
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author(sender, instance, update_fields=None, **kwargs):
+    if update_fields and AUTHOR_PUBLIC_FIELDS.isdisjoint(update_fields):
+        return
+    if instance.recipes_count:
+        bump_on_commit("recipes", f"author:{instance.pk}")
+        touch_recipes(Recipe.objects.filter(author=instance))
+    else:
+        bump_on_commit(f"author:{instance.pk}")
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_user_state(sender, instance, **kwargs):
+    """Избранное, корзина и подписки меняют флаги в ответах
+    пользователя."""
+    touch_on_commit(f"user:{instance.user_id}")
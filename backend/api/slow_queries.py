@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .performance import current, untimed, view_label
+
+logger = logging.getLogger("foodgram.slow_queries")
+
+state = threading.local()
+
+# Кадры библиотек и самих замеров не попадают в стек запроса
+IGNORED_PATHS = ("site-packages", "dist-packages")
+IGNORED_FILES = (
+    __file__,
+    os.path.join(os.path.dirname(__file__), "performance.py"),
+)
+
+# Нормализация SQL для отпечатка: литералы, числа, списки IN (...)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Отпечаток запроса: одинаков для запросов, отличающихся только
+    значениями параметров и длиной списков IN (...)."""
+    normalized = sql.replace("%s", "?")
+    normalized = STRING_LITERAL.sub("?", normalized)
+    normalized = NUMBER.sub("?", normalized)
+    normalized = PLACEHOLDER_LIST.sub("(?+)", normalized)
+    normalized = WHITESPACE.sub(" ", normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def app_stack():
+    """Кадры кода проекта от внешнего к вызвавшему запрос, например
+    "api/serializers.py:71 get_is_favorited"."""
+    base = str(settings.BASE_DIR) + os.sep
+    frames = [
+        f"{os.path.relpath(frame.filename, base)}:{frame.lineno} "
+        f"{frame.name}"
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(base)
+        and frame.filename not in IGNORED_FILES
+        and not any(path in frame.filename for path in IGNORED_PATHS)
+    ]
+    return frames[-settings.SLOW_QUERY_STACK_DEPTH:]
+
+
+def explain(connection, sql, params):
+    """План запроса: EXPLAIN (ANALYZE, BUFFERS) в PostgreSQL, EXPLAIN
+    QUERY PLAN в SQLite.
+
+    ANALYZE выполняет запрос повторно, поэтому план снимается только
+    для SELECT; ошибка EXPLAIN откатывается к точке сохранения и не
+    прерывает транзакцию запроса.
+    """
+    if sql.lstrip()[:6].upper() != "SELECT":
+        return None
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def record(connection, sql, params, many, duration):
+    timings = current()
+    label = timings and view_label(timings.request)
+    entry = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(duration * 1000, 2),
+        "fingerprint": fingerprint(sql),
+        "sql": sql,
+        "view": label and ".".join(label),
+        "stack": app_stack(),
+    }
+    if settings.SLOW_QUERY_EXPLAIN and not many:
+        try:
+            entry["plan"] = explain(connection, sql, params)
+        except Exception as error:
+            entry["plan_error"] = str(error)
+    logger.warning(json.dumps(entry, ensure_ascii=False))
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Записать запрос в журнал медленных, если он дольше порога."""
+    if getattr(state, "active", False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        # Запросы самой записи (EXPLAIN) не попадают ни в журнал, ни в
+        # число запросов Server-Timing и метрик
+        state.active = True
+        try:
+            with untimed():
+                record(context["connection"], sql, params, many, duration)
+        finally:
+            state.active = False
+    return result
+
+
+def install(connection, **kwargs):
+    """Подключить журнал к соединению; обработчик connection_created."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
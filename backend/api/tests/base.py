@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from api.cache import get_cache
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+def create_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password="password",
+        first_name="Имя",
+        last_name="Фамилия",
+        **kwargs,
+    )
+
+
+def create_tag(slug):
+    return Tag.objects.create(name=slug, slug=slug)
+
+
+def create_ingredient(name, measurement_unit="г"):
+    return Ingredient.objects.create(
+        name=name, measurement_unit=measurement_unit
+    )
+
+
+def create_recipe(author, name="Рецепт", ingredients=(), tags=(), **kwargs):
+    """Рецепт с ингредиентами [(ingredient, amount)] и тегами."""
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        image="recipes/images/recipe.png",
+        text=kwargs.pop("text", "Текст"),
+        cooking_time=kwargs.pop("cooking_time", 10),
+        **kwargs,
+    )
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    return recipe
+
+
+class APITestCase(TestCase):
+    """Тест API: чистый кэш API и временный MEDIA_ROOT.
+
+    Поколения кэша меняются после фиксации транзакции, которой в
+    TestCase нет, поэтому кэш очищается перед каждым тестом.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        get_cache().clear()
@@ -0,0 +1,115 @@
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, ShoppingCart
+
+from .base import APITestCase, create_recipe, create_user
+
+
+class BulkCollectionTest(APITestCase):
+    """Пакетные операции с избранным и корзиной: статус по каждому id."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        author = create_user("author")
+        self.first, self.second = (
+            create_recipe(author, name=name) for name in ("Суп", "Каша")
+        )
+        self.missing = self.second.pk + 100
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {"ids": ids}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(item["id"], item["status"]) for item in response.data]
+
+    def test_bulk_favorite(self):
+        url = "/api/recipes/favorite/bulk/"
+        Favorite.objects.create(user=self.user, recipe=self.first)
+        self.assertEqual(
+            self.bulk(
+                "post",
+                url,
+                [self.first.pk, self.second.pk, self.missing, self.second.pk],
+            ),
+            [
+                (self.first.pk, "exists"),
+                (self.second.pk, "added"),
+                (self.missing, "not_found"),
+            ],
+        )
+        self.assertEqual(
+            set(
+                Favorite.objects.filter(user=self.user).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            {self.first.pk, self.second.pk},
+        )
+        self.assertEqual(
+            self.bulk("delete", url, [self.second.pk, self.missing]),
+            [(self.second.pk, "removed"), (self.missing, "not_found")],
+        )
+        self.assertEqual(
+            self.bulk("delete", url, [self.second.pk]),
+            [(self.second.pk, "missing")],
+        )
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.favorites_count, 1)
+        self.assertEqual(self.second.favorites_count, 0)
+
+    def test_bulk_shopping_cart(self):
+        url = "/api/recipes/shopping_cart/bulk/"
+        self.assertEqual(
+            self.bulk("post", url, [self.first.pk, self.second.pk]),
+            [(self.first.pk, "added"), (self.second.pk, "added")],
+        )
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(
+            self.bulk("delete", url, [self.first.pk, self.missing]),
+            [(self.first.pk, "removed"), (self.missing, "not_found")],
+        )
+        self.assertEqual(
+            list(
+                ShoppingCart.objects.filter(user=self.user).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            [self.second.pk],
+        )
+
+    def test_bulk_status(self):
+        Favorite.objects.create(user=self.user, recipe=self.first)
+        ShoppingCart.objects.create(user=self.user, recipe=self.second)
+        response = self.client.get(
+            "/api/recipes/status/",
+            {"ids": [self.second.pk, self.first.pk, self.missing]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.data),
+            [
+                {
+                    "id": self.first.pk,
+                    "is_favorited": True,
+                    "is_in_shopping_cart": False,
+                },
+                {
+                    "id": self.second.pk,
+                    "is_favorited": False,
+                    "is_in_shopping_cart": True,
+                },
+            ],
+        )
+
+    def test_empty_ids_are_rejected(self):
+        response = self.client.post(
+            "/api/recipes/favorite/bulk/", {"ids": []}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
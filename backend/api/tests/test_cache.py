@@ -0,0 +1,78 @@
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from .base import (
+    APITestCase, create_ingredient, create_recipe, create_tag, create_user,
+)
+
+
+@override_settings(API_CACHE_TIMEOUT=300)
+class AnonymousRecipeCacheTest(APITestCase):
+    """Кэш анонимных ответов сбрасывается после записи."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.tag = create_tag("breakfast")
+        self.ingredient = create_ingredient("Соль")
+        self.recipe = create_recipe(
+            self.author, ingredients=[(self.ingredient, 5)], tags=[self.tag]
+        )
+        self.anonymous = APIClient()
+        self.detail_url = f"/api/recipes/{self.recipe.pk}/"
+
+    def get(self, url, expected_cache):
+        response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], expected_cache)
+        return response.data
+
+    def assert_cached(self, url):
+        self.get(url, "MISS")
+        self.get(url, "HIT")
+
+    def test_recipe_update_through_api(self):
+        self.assert_cached("/api/recipes/")
+        self.assert_cached(self.detail_url)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(
+                self.detail_url,
+                {
+                    "name": "Новое название",
+                    "ingredients": [
+                        {"id": self.ingredient.pk, "amount": 10}
+                    ],
+                    "tags": [self.tag.pk],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        data = self.get("/api/recipes/", "MISS")
+        self.assertEqual(data["results"][0]["name"], "Новое название")
+        data = self.get(self.detail_url, "MISS")
+        self.assertEqual(data["name"], "Новое название")
+
+    def test_author_profile_change(self):
+        self.assert_cached(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = "Другое"
+            self.author.save()
+        data = self.get(self.detail_url, "MISS")
+        self.assertEqual(data["author"]["first_name"], "Другое")
+
+    def test_tag_rename(self):
+        self.assert_cached("/api/recipes/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = "Завтрак"
+            self.tag.save()
+        data = self.get("/api/recipes/", "MISS")
+        self.assertEqual(data["results"][0]["tags"][0]["name"], "Завтрак")
+
+    def test_authenticated_requests_bypass_cache(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        client.get("/api/recipes/")
+        response = client.get("/api/recipes/")
+        self.assertNotIn("X-Cache", response)
@@ -0,0 +1,26 @@
+from rest_framework.test import APIClient
+
+from .base import APITestCase, create_recipe, create_user
+
+
+class RecipeConditionalGetTest(APITestCase):
+    """Условные GET для рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(create_user("author"))
+        self.client = APIClient()
+
+    def test_not_numeric_id_is_not_found(self):
+        response = self.client.get("/api/recipes/abc/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_recipe_is_not_found(self):
+        response = self.client.get(f"/api/recipes/{self.recipe.pk + 1}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_matching_etag_is_not_modified(self):
+        url = f"/api/recipes/{self.recipe.pk}/"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,45 @@
+from bisect import bisect_left
+from unittest import mock
+
+from api.ingredient_index import IngredientPrefixIndex
+
+from .base import APITestCase, create_ingredient
+
+
+class IngredientPrefixIndexTest(APITestCase):
+    """Поиск ингредиентов по индексу в памяти."""
+
+    def setUp(self):
+        super().setUp()
+        for name in ("Соль", "Сахар", "Сливки", "Перец"):
+            create_ingredient(name)
+        self.index = IngredientPrefixIndex()
+
+    def names(self, items):
+        return [item["name"] for item in items]
+
+    def test_search_by_prefix(self):
+        self.assertEqual(
+            self.names(self.index.search("с")), ["Сахар", "Сливки", "Соль"]
+        )
+        self.assertEqual(self.names(self.index.search("СО")), ["Соль"])
+
+    def test_rebuild_during_search_is_not_mixed(self):
+        self.index.search("")
+        calls = []
+
+        def rebuild_between_lookups(*args, **kwargs):
+            # Перестройка между двумя бинарными поисками одного запроса
+            if not calls:
+                with self.captureOnCommitCallbacks(execute=True):
+                    create_ingredient("Базилик")
+                self.index.ensure_fresh()
+            calls.append(args)
+            return bisect_left(*args, **kwargs)
+
+        with mock.patch(
+            "api.ingredient_index.bisect_left", rebuild_between_lookups
+        ):
+            found = self.index.search("с")
+        self.assertEqual(self.names(found), ["Сахар", "Сливки", "Соль"])
+        self.assertEqual(self.names(self.index.search("б")), ["Базилик"])
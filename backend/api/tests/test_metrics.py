@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.metrics import collect, hit_ratios
+from recipes.collection import add_recipes
+from recipes.models import ShoppingCart
+
+from .base import APITestCase, create_ingredient, create_recipe, create_user
+
+
+def dead_pid():
+    """pid только что завершившегося процесса."""
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+class MetricsTest(APITestCase):
+    """Сбор метрик воркеров и доли попаданий в кэши."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write_worker(self, pid, token, value):
+        path = os.path.join(self.directory, f"worker-{pid}-{token}.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "counters": [["foodgram_test_total", {}, value]],
+                    "histograms": [],
+                },
+                file,
+            )
+        return path
+
+    def total(self):
+        counters, _ = collect()
+        return counters[("foodgram_test_total", ())]
+
+    def test_dead_worker_files_are_retired(self):
+        pid = dead_pid()
+        first = self.write_worker(pid, "aaaa", 3)
+        alive = self.write_worker(os.getpid(), "bbbb", 1)
+        self.assertEqual(self.total(), 4)
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(alive))
+        # Процесс с тем же pid пишет свой файл, не затирая чужой
+        self.write_worker(os.getpid(), "cccc", 2)
+        self.assertEqual(self.total(), 6)
+        self.write_worker(pid, "dddd", 5)
+        self.assertEqual(self.total(), 11)
+        self.assertEqual(self.total(), 11)
+
+    def test_hit_ratios_of_download_and_index_caches(self):
+        user = create_user("user")
+        recipe = create_recipe(
+            user, ingredients=[(create_ingredient("Соль"), 5)]
+        )
+        add_recipes(ShoppingCart, user.pk, [recipe.pk])
+        client = APIClient()
+        client.force_authenticate(user)
+        for _ in range(2):
+            b"".join(client.get("/api/recipes/download_shopping_cart/"))
+            client.get("/api/ingredients/", {"name": "Со"})
+        counters, _ = collect()
+        ratios = {
+            dict(labels)["cache"]: value
+            for (_, labels), value in hit_ratios(counters).items()
+        }
+        self.assertEqual(ratios["shopping_list"], 0.5)
+        self.assertIn("ingredient_index", ratios)
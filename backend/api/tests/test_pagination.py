@@ -0,0 +1,77 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Follow
+
+from .base import APITestCase, create_recipe, create_user
+
+
+class CursorPaginationTest(APITestCase):
+    """Курсорный режим списка рецептов и подписок по ?cursor=."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        for number in range(7):
+            author = create_user(f"author{number}")
+            Follow.objects.create(user=self.user, author=author)
+            create_recipe(author, name=f"Рецепт {number}")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, params):
+        """Пройти все страницы по ссылкам next, вернуть страницы."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            if response.data["next"] is None:
+                return pages
+            response = self.client.get(response.data["next"])
+
+    def test_recipes_cursor_pages(self):
+        with CaptureQueriesContext(connection) as queries:
+            pages = self.walk("/api/recipes/", {"cursor": "", "limit": 3})
+        self.assertEqual(
+            [len(page["results"]) for page in pages], [3, 3, 1]
+        )
+        self.assertNotIn("count", pages[0])
+        # Курсорный режим не считает страницы через COUNT(*)
+        self.assertFalse(
+            any("__count" in query["sql"] for query in queries)
+        )
+        self.assertEqual(
+            [
+                recipe["id"]
+                for page in pages
+                for recipe in page["results"]
+            ],
+            list(
+                Recipe.objects.order_by("-pub_date", "-id").values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+
+    def test_recipes_page_mode_is_unchanged(self):
+        response = self.client.get("/api/recipes/", {"limit": 3, "page": 3})
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_subscriptions_cursor_pages(self):
+        pages = self.walk(
+            "/api/users/subscriptions/", {"cursor": "", "limit": 4}
+        )
+        self.assertEqual([len(page["results"]) for page in pages], [4, 3])
+        self.assertNotIn("count", pages[0])
+        self.assertEqual(
+            [author["id"] for page in pages for author in page["results"]],
+            list(
+                Follow.objects.filter(user=self.user)
+                .order_by("-id")
+                .values_list("author_id", flat=True)
+            ),
+        )
@@ -0,0 +1,70 @@
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+from .base import (
+    APITestCase, create_ingredient, create_recipe, create_tag, create_user,
+)
+
+# Запросов к БД на список и на рецепт при любом размере страницы
+LIST_QUERIES = 5
+DETAIL_QUERIES = 4
+
+
+class RecipeQueryCountTest(APITestCase):
+    """Число запросов списка и рецепта не зависит от объема данных."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        tags = [create_tag(f"tag{number}") for number in range(3)]
+        ingredients = [
+            create_ingredient(f"Ингредиент {number}") for number in range(5)
+        ]
+        self.recipes = []
+        for number in range(8):
+            author = create_user(f"author{number}")
+            Follow.objects.create(user=self.user, author=author)
+            recipe = create_recipe(
+                author,
+                name=f"Рецепт {number}",
+                ingredients=[
+                    (ingredient, amount)
+                    for amount, ingredient in enumerate(
+                        ingredients[:number % 5 + 1], 1
+                    )
+                ],
+                tags=tags[:number % 3 + 1],
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            self.recipes.append(recipe)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Справочник тегов для фильтра загружается первым запросом
+        self.client.get("/api/recipes/")
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for limit in (1, 3, 6):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(LIST_QUERIES):
+                    response = self.client.get(
+                        "/api/recipes/", {"limit": limit}
+                    )
+                self.assertEqual(len(response.data["results"]), limit)
+                recipe = response.data["results"][0]
+                self.assertTrue(recipe["is_favorited"])
+                self.assertTrue(recipe["is_in_shopping_cart"])
+                self.assertTrue(recipe["author"]["is_subscribed"])
+
+    def test_detail_queries_do_not_depend_on_recipe_size(self):
+        for recipe in self.recipes[:5]:
+            with self.subTest(ingredients=recipe.ingredients.count()):
+                with self.assertNumQueries(DETAIL_QUERIES):
+                    response = self.client.get(f"/api/recipes/{recipe.pk}/")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.data["ingredients"]),
+                    recipe.recipe_ingredients.count(),
+                )
@@ -0,0 +1,64 @@
+from rest_framework.test import APIClient
+
+from .base import APITestCase, create_ingredient, create_tag, create_user
+
+# Картинка 1x1 для полей Base64ImageField
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf"
+    "FcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+class RecipeWriteTest(APITestCase):
+    """Проверка id ингредиентов и тегов при записи рецепта."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(create_user("author"))
+        self.tag = create_tag("breakfast")
+        self.ingredient = create_ingredient("Соль")
+
+    def payload(self, **kwargs):
+        return {
+            "ingredients": [{"id": self.ingredient.pk, "amount": 1}],
+            "tags": [self.tag.pk],
+            "image": IMAGE,
+            "name": "Рецепт",
+            "text": "Текст",
+            "cooking_time": 10,
+            **kwargs,
+        }
+
+    def test_create(self):
+        response = self.client.post(
+            "/api/recipes/", self.payload(), format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_missing_ids_are_reported_together(self):
+        missing = self.ingredient.pk + 100
+        response = self.client.post(
+            "/api/recipes/",
+            self.payload(
+                ingredients=[
+                    {"id": missing, "amount": 1},
+                    {"id": self.ingredient.pk, "amount": 1},
+                    {"id": missing + 1, "amount": 1},
+                ],
+                tags=[self.tag.pk + 100, self.tag.pk, self.tag.pk + 101],
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                "ingredients": [
+                    {"id": ["Ингредиент не найден!"]},
+                    {},
+                    {"id": ["Ингредиент не найден!"]},
+                ],
+                "tags": ["Тег не найден!", "Тег не найден!"],
+            },
+        )
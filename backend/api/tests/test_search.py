@@ -0,0 +1,89 @@
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite
+
+from .base import (
+    APITestCase, create_ingredient, create_recipe, create_tag, create_user,
+)
+
+
+class RecipeSearchTest(APITestCase):
+    """Полнотекстовый поиск рецептов вместе с фильтрами списка."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.author = create_user("author")
+        other = create_user("other")
+        self.soup = create_tag("soup")
+        dinner = create_tag("dinner")
+        beet = create_ingredient("Свекла")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.borscht = create_recipe(
+                self.author,
+                name="Борщ",
+                text="Суп со свеклой",
+                ingredients=[(beet, 300)],
+                tags=[self.soup],
+            )
+            self.salad = create_recipe(
+                self.author,
+                name="Винегрет",
+                text="Салат",
+                ingredients=[(beet, 200)],
+                tags=[dinner],
+            )
+            self.beet_soup = create_recipe(
+                other,
+                name="Свекольный суп",
+                text="Холодный",
+                ingredients=[(beet, 100)],
+                tags=[self.soup],
+            )
+        Favorite.objects.create(user=self.user, recipe=self.salad)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            "/api/recipes/", {"search": query, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["count"], len(response.data["results"])
+        )
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def test_search_by_name_ingredients_and_text(self):
+        self.assertEqual(
+            set(self.search("свекл")),
+            {self.borscht.pk, self.salad.pk, self.beet_soup.pk},
+        )
+        self.assertEqual(self.search("холодный"), [self.beet_soup.pk])
+        self.assertEqual(self.search("нет такого"), [])
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(self.search("суп")[0], self.beet_soup.pk)
+
+    def test_search_with_tags(self):
+        self.assertEqual(
+            set(self.search("свекл", tags="soup")),
+            {self.borscht.pk, self.beet_soup.pk},
+        )
+
+    def test_search_with_author(self):
+        self.assertEqual(
+            set(self.search("свекл", author=self.author.pk)),
+            {self.borscht.pk, self.salad.pk},
+        )
+
+    def test_search_with_favorites(self):
+        self.assertEqual(
+            self.search("свекл", is_favorited=1), [self.salad.pk]
+        )
+
+    def test_search_with_tags_and_author(self):
+        self.assertEqual(
+            self.search("свекл", tags="soup", author=self.author.pk),
+            [self.borscht.pk],
+        )
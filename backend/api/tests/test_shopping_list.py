@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+import re
+
+from rest_framework.test import APIClient
+
+from api.shopping_list import PDF_LINES_PER_PAGE, pdf_text
+from recipes.collection import add_recipes
+from recipes.models import ShoppingCart
+
+from .base import APITestCase, create_ingredient, create_recipe, create_user
+
+
+class ShoppingListDownloadTest(APITestCase):
+    """Скачивание списка покупок."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.ingredient = create_ingredient("Соль", "г")
+        recipe = create_recipe(
+            create_user("author"), ingredients=[(self.ingredient, 5)]
+        )
+        add_recipes(ShoppingCart, self.user.pk, [recipe.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format="txt"):
+        response = self.client.get(
+            "/api/recipes/download_shopping_cart/", {"format": file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response).decode()
+
+    def fill_cart(self, count):
+        """Корзина из двух рецептов с count общими ингредиентами."""
+        ingredients = [
+            create_ingredient(f"Ингредиент {number:03}", "шт")
+            for number in range(count)
+        ]
+        author = create_user("chef")
+        recipes = [
+            create_recipe(
+                author,
+                ingredients=[
+                    (ingredient, amount) for ingredient in ingredients
+                ],
+            )
+            for amount in (1, 2)
+        ]
+        add_recipes(
+            ShoppingCart, self.user.pk, [recipe.pk for recipe in recipes]
+        )
+
+    def stream(self, file_format):
+        response = self.client.get(
+            "/api/recipes/download_shopping_cart/", {"format": file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response["Content-Disposition"],
+            f'attachment; filename="shopping_cart.{file_format}"',
+        )
+        return response, b"".join(response.streaming_content)
+
+    def test_txt(self):
+        self.fill_cart(2)
+        response, content = self.stream("txt")
+        self.assertEqual(
+            response["Content-Type"], "text/plain; charset=utf-8"
+        )
+        self.assertEqual(
+            content.decode().splitlines(),
+            [
+                "Список покупок:",
+                "• Ингредиент 000 (шт) — 3",
+                "• Ингредиент 001 (шт) — 3",
+                "• Соль (г) — 5",
+            ],
+        )
+
+    def test_csv(self):
+        self.fill_cart(2)
+        _, content = self.stream("csv")
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(
+            rows,
+            [
+                ["Ингредиент", "Единица измерения", "Количество"],
+                ["Ингредиент 000", "шт", "3"],
+                ["Ингредиент 001", "шт", "3"],
+                ["Соль", "г", "5"],
+            ],
+        )
+
+    def test_json(self):
+        self.fill_cart(1)
+        response, content = self.stream("json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            json.loads(content),
+            [
+                {
+                    "name": "Ингредиент 000",
+                    "measurement_unit": "шт",
+                    "amount": 3,
+                },
+                {"name": "Соль", "measurement_unit": "г", "amount": 5},
+            ],
+        )
+
+    def test_pdf(self):
+        self.fill_cart(PDF_LINES_PER_PAGE)
+        response, content = self.stream("pdf")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(content.startswith(b"%PDF-1.4"))
+        self.assertTrue(content.endswith(b"%%EOF\n"))
+        self.assertIn(b"/Count 2", content)
+        self.assertIn(pdf_text("• Соль (г) — 5"), content)
+        # Смещения xref указывают на начала объектов
+        xref = int(re.search(rb"startxref\n(\d+)", content).group(1))
+        self.assertTrue(content[xref:].startswith(b"xref"))
+        offsets = re.findall(rb"(\d{10}) 00000 n", content[xref:])
+        for number, offset in enumerate(offsets, 1):
+            self.assertTrue(
+                content[int(offset):].startswith(b"%d 0 obj" % number)
+            )
+
+    def test_cached_file_matches_stream(self):
+        for file_format in ("txt", "csv", "json", "pdf"):
+            with self.subTest(file_format=file_format):
+                _, streamed = self.stream(file_format)
+                response = self.client.get(
+                    "/api/recipes/download_shopping_cart/",
+                    {"format": file_format},
+                )
+                self.assertFalse(response.streaming)
+                self.assertEqual(response.content, streamed)
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            "/api/recipes/download_shopping_cart/", {"format": "xml"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_renamed_ingredient_is_not_served_from_cache(self):
+        self.assertIn("Соль", self.download())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.name = "Сахар"
+            self.ingredient.save()
+        content = self.download()
+        self.assertIn("Сахар", content)
+        self.assertNotIn("Соль", content)
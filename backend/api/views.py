@@ -1,5 +1,6 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from itertools import chain
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
@@ -8,44 +9,80 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 
-from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
-)
+from recipes import collection, shopping_list, timeline
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 from users.serializers import RecipeShortSerializer
 
+from .cache import (
+    AnonymousRecipeCacheMixin, cache_stream, get_cache, get_generations,
+    record_stat,
+)
+from .conditional import (
+    RecipeConditionalGetMixin, ReferenceConditionalGetMixin,
+)
+from .constants import SHOPPING_LIST_CHUNK_SIZE
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .ingredient_index import IngredientPrefixSearchMixin
+from .pagination import PageOrCursorPagination, TimelinePagination
 from .permissions import IsAuthorOrReadOnly
+from .reference_cache import (
+    ReferenceCacheViewMixin, ingredient_cache, tag_cache,
+)
 from .serializers import (
-    IngredientSerializer, RecipeCreateSerializer, RecipeListSerializer,
-    TagSerializer,
+    IngredientSerializer, RecipeCreateSerializer, RecipeIdsSerializer,
+    RecipeListSerializer, TagSerializer,
 )
+from .shopping_list import SHOPPING_LIST_FORMATS
+from .signals import touch_on_commit
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    ReferenceConditionalGetMixin,
+    ReferenceCacheViewMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """ViewSet для тегов."""
 
+    timestamp_name = "tags"
+    reference_cache = tag_cache
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReferenceConditionalGetMixin,
+    IngredientPrefixSearchMixin,
+    ReferenceCacheViewMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """ViewSet для ингредиентов."""
 
+    timestamp_name = "ingredients"
+    reference_cache = ingredient_cache
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    RecipeConditionalGetMixin,
+    AnonymousRecipeCacheMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для рецептов."""
 
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     filterset_class = RecipeFilter
-    pagination_class = LimitPageNumberPagination
+    pagination_class = PageOrCursorPagination
+
+    def get_queryset(self):
+        return (
+            Recipe.objects.with_related()
+            .with_user_flags(self.request.user)
+        )
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
@@ -86,20 +123,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def handle_add_recipe(self, user, recipe, model):
         """Обработать добавление рецепта в коллекцию."""
-        if model.objects.filter(user=user, recipe=recipe).exists():
+        if not collection.add_recipes(model, user.pk, [recipe.pk]):
             return Response(
                 {"errors": "Рецепт уже добавлен"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        model.objects.create(user=user, recipe=recipe)
+        touch_on_commit(f"user:{user.pk}")
         serializer = RecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def handle_remove_recipe(self, user, recipe, model):
         """Обработать удаление рецепта из коллекции."""
-        obj = model.objects.filter(user=user, recipe=recipe)
-        if obj.exists():
-            obj.delete()
+        if collection.remove_recipes(model, user.pk, [recipe.pk]):
+            touch_on_commit(f"user:{user.pk}")
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Рецепт не найден"},
@@ -107,47 +143,158 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
     @action(
-        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite/bulk",
+        permission_classes=[IsAuthenticated],
     )
-    def download_shopping_cart(self, request):
-        """Скачать список покупок."""
+    def bulk_favorite(self, request):
+        """Добавить/удалить несколько рецептов в избранном."""
+        return self.bulk_add_or_remove_recipes(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart/bulk",
+        permission_classes=[IsAuthenticated],
+    )
+    def bulk_shopping_cart(self, request):
+        """Добавить/удалить несколько рецептов в списке покупок."""
+        return self.bulk_add_or_remove_recipes(request, ShoppingCart)
+
+    def bulk_add_or_remove_recipes(self, request, model):
+        """Добавить или удалить рецепты из коллекции одним запросом.
+
+        Для каждого id возвращается статус: added/exists при добавлении,
+        removed/missing при удалении и not_found для несуществующих
+        рецептов.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+        found = set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                "id", flat=True
+            )
+        )
         user = request.user
-        shopping_cart = ShoppingCart.objects.filter(user=user)
+        if request.method == "POST":
+            changed = collection.add_recipes(model, user.pk, found)
+            statuses = ("added", "exists")
+        else:
+            changed = collection.remove_recipes(model, user.pk, found)
+            statuses = ("removed", "missing")
+        if changed:
+            touch_on_commit(f"user:{user.pk}")
+        return Response(
+            [
+                {
+                    "id": recipe_id,
+                    "status": (
+                        "not_found" if recipe_id not in found
+                        else statuses[0] if recipe_id in changed
+                        else statuses[1]
+                    ),
+                }
+                for recipe_id in recipe_ids
+            ]
+        )
 
-        if not shopping_cart.exists():
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="status",
+        permission_classes=[IsAuthenticated],
+    )
+    def bulk_status(self, request):
+        """Флаги избранного и корзины для списка рецептов (?ids=1&ids=2)."""
+        serializer = RecipeIdsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            Recipe.objects.filter(id__in=serializer.validated_data["ids"])
+            .with_user_flags(request.user)
+            .order_by("id")
+            .values("id", "is_favorited", "is_in_shopping_cart")
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        pagination_class=TimelinePagination,
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        keys = self.paginator.paginate_timeline(
+            lambda before, size: timeline.feed(request.user.pk, before, size),
+            request,
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, recipe_id in keys]
+        )
+        serializer = RecipeListSerializer(
+            [recipes[pk] for _, pk in keys if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return self.paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+    )
+    def download_shopping_cart(self, request):
+        """Скачать список покупок (?format=txt|csv|json|pdf)."""
+        file_format = request.query_params.get("format", "txt")
+        if file_format not in SHOPPING_LIST_FORMATS:
             return Response(
-                {"errors": "Список покупок пуст"},
+                {
+                    "errors": "Формат должен быть одним из: "
+                    + ", ".join(SHOPPING_LIST_FORMATS)
+                },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        ingredients = self.get_shopping_cart_ingredients(user)
-        shopping_list = self.format_shopping_list(ingredients)
-
-        response = HttpResponse(shopping_list, content_type="text/plain")
+        user = request.user
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
+        # Поколение справочника: переименование ингредиента или смена
+        # единицы измерения меняет файл без изменения корзины
+        (ingredients_generation,) = get_generations("ingredients")
+        cache_key = (
+            f"shopping_list:{user.pk}:{user.shopping_list_version}:"
+            f"{ingredients_generation}:{file_format}"
+        )
+        content = get_cache().get(cache_key)
+        if content is not None:
+            record_stat("shopping_list_cache_hits")
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            record_stat("shopping_list_cache_misses")
+            ingredients = shopping_list.materialized_shopping_list(
+                user
+            ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+            first = next(ingredients, None)
+            if first is None:
+                return Response(
+                    {"errors": "Список покупок пуст"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            response = StreamingHttpResponse(
+                cache_stream(
+                    render(chain((first,), ingredients)), cache_key
+                ),
+                content_type=content_type,
+            )
         response["Content-Disposition"] = (
-            'attachment; filename="shopping_cart.txt"'
+            f'attachment; filename="shopping_cart.{file_format}"'
         )
         return response
 
-    def get_shopping_cart_ingredients(self, user):
-        """Получить ингредиенты из списка покупок с общим количеством."""
-        return (
-            RecipeIngredient.objects.filter(recipe__shopping_cart__user=user)
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
-            .order_by("ingredient__name")
-        )
-
-    def format_shopping_list(self, ingredients):
-        """Форматировать список покупок."""
-        shopping_list = ["Список покупок:\n"]
-        for ingredient in ingredients:
-            shopping_list.append(
-                f"• {ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) — "
-                f"{ingredient['total_amount']}\n"
-            )
-        return "".join(shopping_list)
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= у download_shopping_cart выбирает формат файла,
+        # а не рендерер DRF
+        if self.action == "download_shopping_cart":
+            force = True
+        return super().perform_content_negotiation(request, force)
 
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_link(self, request, **kwargs):
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.performance.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,9 +77,83 @@ if os.getenv('USE_SQLITE', 'False').lower() in ('true', '1', 'yes'):
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': str(BASE_DIR / 'db.sqlite3'),
+            # Тестовая база в файле: общая база в памяти блокирует
+            # таблицы целиком, и конкурентные тесты падают
+            'TEST': {'NAME': str(BASE_DIR / 'test_db.sqlite3')},
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+# Кэш ответов API; при нескольких воркерах нужен общий бэкенд,
+# например django.core.cache.backends.filebased.FileBasedCache
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 300))
+# Максимальный размер тела ответа, которое кладется в кэш целиком
+API_CACHE_MAX_CONTENT_SIZE = int(
+    os.getenv('API_CACHE_MAX_CONTENT_SIZE', 1024 * 1024)
+)
+
+# Индекс ингредиентов для автодополнения: ранжировать по числу рецептов
+# и перестраивать не реже, чем раз в INGREDIENT_INDEX_MAX_AGE секунд
+INGREDIENT_INDEX_RANK_BY_USAGE = os.getenv(
+    'INGREDIENT_INDEX_RANK_BY_USAGE', 'False'
+).lower() in ('true', '1', 'yes')
+INGREDIENT_INDEX_MAX_AGE = int(os.getenv('INGREDIENT_INDEX_MAX_AGE', 600))
+
+# Замеры запросов: заголовок Server-Timing и строка в логе
+# foodgram.performance на каждый запрос. Профилируется доля
+# PERFORMANCE_PROFILE_RATE запросов и запросы сотрудников с заголовком
+# PERFORMANCE_PROFILE_HEADER; профилировщик cprofile или pyinstrument
+PERFORMANCE_TIMING = os.getenv(
+    'PERFORMANCE_TIMING', 'False'
+).lower() in ('true', '1', 'yes')
+PERFORMANCE_PROFILE_RATE = float(os.getenv('PERFORMANCE_PROFILE_RATE', 0))
+PERFORMANCE_PROFILE_HEADER = 'X-Profile'
+PERFORMANCE_PROFILER = os.getenv('PERFORMANCE_PROFILER', 'cprofile')
+PERFORMANCE_PROFILE_DIR = os.getenv(
+    'PERFORMANCE_PROFILE_DIR', str(BASE_DIR / 'profiles')
+)
+
+# Метрики Prometheus на /metrics. Каждый воркер сбрасывает свои метрики
+# в METRICS_DIR не реже раза в METRICS_FLUSH_INTERVAL секунд, /metrics
+# складывает файлы всех воркеров и отвечает только METRICS_ALLOWED_IPS
+METRICS_ENABLED = os.getenv(
+    'METRICS_ENABLED', 'False'
+).lower() in ('true', '1', 'yes')
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+
+# Журнал медленных запросов к БД: JSON-строки с SQL, длительностью,
+# представлением и стеком кода проекта в SLOW_QUERY_LOG_FILE с ротацией.
+# SLOW_QUERY_EXPLAIN добавляет план (в PostgreSQL с ANALYZE, то есть
+# повторным выполнением запроса)
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', 'False'
+).lower() in ('true', '1', 'yes')
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_EXPLAIN = os.getenv(
+    'SLOW_QUERY_EXPLAIN', 'False'
+).lower() in ('true', '1', 'yes')
+SLOW_QUERY_STACK_DEPTH = 8
+SLOW_QUERY_LOG_FILE = os.getenv(
+    'SLOW_QUERY_LOG_FILE', str(BASE_DIR / 'slow_queries.jsonl')
+)
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUP_COUNT = 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -151,10 +227,24 @@ DJOSER = {
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': SLOW_QUERY_LOG_MAX_BYTES,
+            'backupCount': SLOW_QUERY_LOG_BACKUP_COUNT,
+            'formatter': 'message',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -165,6 +255,16 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'foodgram.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -3,6 +3,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics_view
 from api.views import RecipeViewSet
 
 urlpatterns = [
@@ -14,6 +15,7 @@ urlpatterns = [
         RecipeViewSet.as_view({"get": "redirect_to_recipe"}),
         name="short_link",
     ),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models import Q
 
+from . import search, shopping_list
 from .models import (
     Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
 )
@@ -33,15 +35,37 @@ class IngredientAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
 
     list_display = ("name", "author", "get_favorites_count")
+    list_select_related = ("author",)
     search_fields = ("name", "author__username")
-    search_help_text = "Поиск по названию рецепта или автору"
+    search_help_text = (
+        "Поиск по названию, ингредиентам и описанию или логину автора"
+    )
     list_filter = ("tags", "pub_date")
     inlines = (RecipeIngredientInline,)
     filter_horizontal = ("tags",)
 
-    @admin.display(description="В избранном")
+    @admin.display(description="В избранном", ordering="favorites_count")
     def get_favorites_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    def get_search_results(self, request, queryset, search_term):
+        """Искать по полнотекстовому индексу, а не icontains."""
+        condition = search.matches(search_term)
+        if condition is None:
+            return queryset, False
+        return (
+            queryset.filter(
+                condition | Q(author__username__iexact=search_term.strip())
+            ),
+            False,
+        )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            shopping_list.rebuild(
+                form.instance.shopping_cart.values_list("user_id", flat=True)
+            )
 
 
 @admin.register(Favorite)
@@ -0,0 +1,61 @@
+from django.db import transaction
+
+from . import shopping_list
+from .counters import change_counter
+from .models import Favorite, Recipe, ShoppingCart
+from .sql import delete_returning, insert_ignore
+
+# Счетчики рецепта, которые поддерживают связанные модели
+RECIPE_COUNTERS = {
+    Favorite: "favorites_count",
+    ShoppingCart: "shopping_cart_count",
+}
+
+
+def recipes_added(model, user_id, recipe_ids):
+    """Обновить счетчики рецептов и список покупок после добавления."""
+    if not recipe_ids:
+        return
+    change_counter(
+        Recipe.objects.filter(pk__in=recipe_ids), RECIPE_COUNTERS[model], 1
+    )
+    if model is ShoppingCart:
+        shopping_list.add_recipes(user_id, recipe_ids)
+
+
+def recipes_removed(model, user_id, recipe_ids):
+    """Обновить счетчики рецептов и список покупок после удаления."""
+    if not recipe_ids:
+        return
+    change_counter(
+        Recipe.objects.filter(pk__in=recipe_ids), RECIPE_COUNTERS[model], -1
+    )
+    if model is ShoppingCart:
+        shopping_list.remove_recipes(user_id, recipe_ids)
+
+
+def add_recipes(model, user_id, recipe_ids):
+    """Добавить рецепты в коллекцию одним INSERT ... ON CONFLICT.
+
+    Возвращает множество действительно добавленных id. Вставка идет в
+    обход сигналов, поэтому счетчики и список покупок обновляются здесь.
+    """
+    with transaction.atomic():
+        added = set(
+            insert_ignore(model, "user", user_id, "recipe", recipe_ids)
+        )
+        recipes_added(model, user_id, added)
+    return added
+
+
+def remove_recipes(model, user_id, recipe_ids):
+    """Удалить рецепты из коллекции одним DELETE ... RETURNING.
+
+    Возвращает множество действительно удаленных id.
+    """
+    with transaction.atomic():
+        removed = delete_returning(
+            model, "user", user_id, "recipe", recipe_ids
+        )
+        recipes_removed(model, user_id, removed)
+    return removed
@@ -15,3 +15,25 @@ MEASUREMENT_UNIT_MAX_LENGTH = 64
 
 # Минимальное количество ингредиентов в рецепте
 MIN_INGREDIENTS_COUNT = 1
+
+# Сколько последних рецептов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_LIMIT = 50
+
+# Рецепты авторов с большим числом подписчиков не рассылаются по лентам,
+# а подмешиваются в ленту при чтении
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+
+# Размер пачки при рассылке рецепта по лентам
+TIMELINE_BATCH_SIZE = 1000
+
+# Конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = "russian"
+
+# Таблица FTS5 с поисковыми документами рецептов в SQLite
+SEARCH_FTS_TABLE = "recipes_recipe_fts"
+
+# Веса bm25 для столбцов FTS5: название, ингредиенты, описание
+SEARCH_RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Размер пачки рецептов при пересборке поискового индекса
+SEARCH_BATCH_SIZE = 1000
@@ -0,0 +1,59 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно изменить счетчик на delta через F-выражение."""
+    return queryset.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с количеством строк queryset, ссылающихся на объект."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+def recount(queryset, field, counted_queryset, counted_field):
+    """Пересчитать счетчик одним запросом для строк с расхождением.
+
+    Возвращает количество исправленных строк.
+    """
+    actual = count_subquery(counted_queryset, counted_field)
+    return (
+        queryset.annotate(actual=actual)
+        .exclude(**{field: F("actual")})
+        .update(**{field: actual})
+    )
+
+
+class CounterFieldsMixin:
+    """Не перезаписывать счетчики при полном сохранении объекта.
+
+    Счетчики меняются атомарными UPDATE с F(), а объект в памяти к
+    моменту save() мог устареть: полное сохранение вернуло бы в базу
+    старые значения и потеряло бы конкурентные изменения. Поэтому
+    сохранение существующего объекта без update_fields пишет все поля,
+    кроме counter_fields.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
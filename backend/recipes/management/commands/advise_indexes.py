@@ -0,0 +1,478 @@
+import json
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+
+from recipes.management.commands.benchmark import consume
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+# Канонические запросы API: имя и адрес. {tag}, {author}, {recipe},
+# {prefix} и {word} берутся из текущей базы
+SCENARIOS = (
+    ("RecipeViewSet.list", "/api/recipes/"),
+    ("RecipeViewSet.list page", "/api/recipes/?page=5"),
+    ("RecipeFilter tags", "/api/recipes/?tags={tag}"),
+    ("RecipeFilter author", "/api/recipes/?author={author}"),
+    ("RecipeFilter is_favorited", "/api/recipes/?is_favorited=1"),
+    (
+        "RecipeFilter is_in_shopping_cart",
+        "/api/recipes/?is_in_shopping_cart=1",
+    ),
+    ("RecipeFilter search", "/api/recipes/?search={word}"),
+    ("RecipeViewSet.retrieve", "/api/recipes/{recipe}/"),
+    ("RecipeViewSet.feed", "/api/recipes/feed/"),
+    (
+        "RecipeViewSet.download_shopping_cart",
+        "/api/recipes/download_shopping_cart/?format=json",
+    ),
+    ("IngredientFilter name", "/api/ingredients/?name={prefix}"),
+    ("CustomUserViewSet.list", "/api/users/"),
+    (
+        "CustomUserViewSet.subscriptions",
+        "/api/users/subscriptions/?recipes_limit=3",
+    ),
+)
+
+# Приложения, индексы которых проверяются на избыточность
+AUDITED_APPS = ("recipes", "users")
+
+# Ограничение Django на длину имени индекса
+INDEX_NAME_LENGTH = 30
+
+# Разбор SQL Django: таблицы с псевдонимами, сравнения с параметрами
+# (условия соединений не в счет) и сортировка внешнего запроса
+TABLE_ALIAS = re.compile(r'"(\w+)"(?: AS)? "?\b([A-Z]\d+)\b"?')
+CONDITION = re.compile(
+    r'(?:"(\w+)"|\b([A-Z]\d+))\."(\w+)"\s*'
+    r"(?:=\s*%s|IN\s*\(\s*%s|IS NULL)"
+)
+ORDER_BY = re.compile(r"\bORDER BY (.+?)(?:\bLIMIT\b|\bOFFSET\b|$)")
+ORDER_COLUMN = re.compile(r'(?:"(\w+)"|\b([A-Z]\d+))\."(\w+)"( DESC)?')
+FROM_TABLE = re.compile(r'\bFROM "(\w+)"')
+FROM_SUBQUERY = re.compile(r"\bFROM \(\)")
+
+
+def strip_groups(sql):
+    """SQL без содержимого скобок и список вырезанных групп."""
+    outer, groups, depth, start = [], [], 0, 0
+    for position, char in enumerate(sql):
+        if char == "(":
+            if depth == 0:
+                start = position + 1
+                outer.append(char)
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                groups.append(sql[start:position])
+                outer.append(char)
+        elif depth == 0:
+            outer.append(char)
+    return "".join(outer), groups
+
+
+def main_query(sql):
+    """Внешний запрос, читающий таблицы: обертки COUNT(*) FROM (...)
+    раскрываются до подзапроса."""
+    outer, groups = strip_groups(sql)
+    match = FROM_SUBQUERY.search(outer)
+    if match is None:
+        return outer
+    return main_query(groups[outer[: match.end()].count("()") - 1])
+
+
+def parse_query(sql):
+    """Псевдонимы, столбцы условий по таблицам, сортировка и главная
+    таблица запроса."""
+    aliases = dict(
+        (alias, table) for table, alias in TABLE_ALIAS.findall(sql)
+    )
+    conditions = defaultdict(list)
+    for table, alias, column in CONDITION.findall(sql):
+        table = table or aliases.get(alias)
+        if table and column not in conditions[table]:
+            conditions[table].append(column)
+    outer = main_query(sql)
+    order = []
+    match = ORDER_BY.search(outer)
+    if match:
+        order = [
+            (table or aliases.get(alias), column, bool(descending))
+            for table, alias, column, descending in ORDER_COLUMN.findall(
+                match.group(1)
+            )
+        ]
+    table = FROM_TABLE.search(outer)
+    return aliases, conditions, order, outer, table and table.group(1)
+
+
+def explain_sqlite(sql, params, analyze):
+    """План SQLite: строки EXPLAIN QUERY PLAN и найденные проблемы."""
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        details = [row[-1] for row in cursor.fetchall()]
+    problems = []
+    for detail in details:
+        match = re.match(r"SCAN (\w+)$", detail)
+        if match:
+            problems.append(("seq_scan", match.group(1), None, detail))
+        elif detail.startswith("USE TEMP B-TREE FOR"):
+            problems.append(("sort", None, None, detail))
+    return "\n".join(details), problems
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+def rows(node):
+    return node.get("Actual Rows", node.get("Plan Rows"))
+
+
+def explain_postgresql(sql, params, analyze):
+    """План PostgreSQL в JSON и найденные проблемы."""
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN ({options}) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems = []
+    for node in walk(plan[0]["Plan"]):
+        if node["Node Type"] == "Seq Scan":
+            problems.append(
+                ("seq_scan", node["Relation Name"], rows(node), "Seq Scan")
+            )
+        elif node["Node Type"] in ("Sort", "Incremental Sort"):
+            # Важен размер входа сортировки, а не ее результата под LIMIT
+            problems.append(
+                (
+                    "sort",
+                    None,
+                    rows(node["Plans"][0]),
+                    "Sort Key: " + ", ".join(node.get("Sort Key", [])),
+                )
+            )
+    return json.dumps(plan, ensure_ascii=False, indent=1), problems
+
+
+EXPLAINERS = {"sqlite": explain_sqlite, "postgresql": explain_postgresql}
+
+
+def table_models():
+    return {
+        model._meta.db_table: model
+        for model in apps.get_models(include_auto_created=True)
+    }
+
+
+def table_indexes(table):
+    """Индексы таблицы: имя, столбцы и признак уникальности."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        (name, tuple(info["columns"]), info["unique"] or info["primary_key"])
+        for name, info in constraints.items()
+        if (info["index"] or info["unique"] or info["primary_key"])
+        and info["columns"]
+    ]
+
+
+def covered(columns, indexes):
+    return any(
+        index[: len(columns)] == tuple(columns) for _, index, _ in indexes
+    )
+
+
+def redundant_indexes(indexes):
+    """Неуникальные индексы, столбцы которых — начало другого индекса,
+    и имена покрывающих их индексов."""
+    redundant = {}
+    for name, columns, unique in indexes:
+        if unique:
+            continue
+        covering = [
+            other
+            for other, other_columns, _ in indexes
+            if other != name
+            and len(other_columns) > len(columns)
+            and other_columns[: len(columns)] == columns
+        ]
+        if covering:
+            redundant[name] = (columns, sorted(covering))
+    return redundant
+
+
+def index_name(model, names):
+    name = "_".join(
+        [model._meta.model_name]
+        + [name.lstrip("-").replace("_id", "") for name in names]
+    )
+    return name[: INDEX_NAME_LENGTH - 4] + "_idx"
+
+
+class Command(BaseCommand):
+    """Команда для аудита планов запросов API и подбора индексов."""
+
+    help = (
+        "Выполнить канонические запросы API на текущей базе, собрать их "
+        "планы, найти полные просмотры и сортировки больших таблиц, "
+        "предложить недостающие индексы и найти избыточные"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="Таблицы меньше этого размера не считаются проблемой",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="PostgreSQL: EXPLAIN ANALYZE, запросы выполняются",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            help="id пользователя запросов (по умолчанию с большим "
+            "числом подписок)",
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="Печатать все планы"
+        )
+
+    def scenario_values(self):
+        author = User.objects.order_by("-recipes_count").first()
+        recipe = Recipe.objects.order_by("-pub_date", "-id").first()
+        tag = Tag.objects.order_by("id").first()
+        ingredient = Ingredient.objects.order_by("id").first()
+        if None in (author, recipe, tag, ingredient):
+            raise CommandError(
+                "В базе нет рецептов, тегов или ингредиентов: заполните "
+                "ее, например командой generate_dataset"
+            )
+        return {
+            "author": author.pk,
+            "recipe": recipe.pk,
+            "tag": tag.slug,
+            "prefix": ingredient.name[:3],
+            "word": ingredient.name.split()[0],
+        }
+
+    def capture(self, client, url):
+        """SELECT-запросы к БД, выполненные при обработке адреса."""
+        queries = []
+
+        def collect(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith("SELECT"):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(collect):
+            response = client.get(url)
+            consume(response)
+        if not 200 <= response.status_code < 300:
+            raise CommandError(
+                f"{url}: {response.status_code}: "
+                f"{response.content[:200]!r}"
+            )
+        return response.status_code, queries
+
+    def indexes(self, table):
+        if table not in self.index_cache:
+            self.index_cache[table] = table_indexes(table)
+        return self.index_cache[table]
+
+    def size(self, table):
+        if table not in self.sizes:
+            self.sizes[table] = self.models[table].objects.count()
+        return self.sizes[table]
+
+    def handle(self, *args, **options):
+        explainer = EXPLAINERS.get(connection.vendor)
+        if explainer is None:
+            raise CommandError(
+                f"Планы {connection.vendor} не поддерживаются, нужны "
+                "PostgreSQL или SQLite"
+            )
+        if options["user"]:
+            user = User.objects.filter(pk=options["user"]).first()
+        else:
+            user = User.objects.order_by("-following_count", "id").first()
+        if user is None:
+            raise CommandError("Пользователь не найден")
+        client = APIClient()
+        client.force_authenticate(user)
+        values = self.scenario_values()
+        self.models = table_models()
+        self.sizes, self.index_cache, self.suggestions = {}, {}, {}
+        # Тестовое окружение добавляет testserver в ALLOWED_HOSTS, иначе
+        # каждый сценарий получит 400 без единого запроса к БД
+        setup_test_environment()
+        try:
+            self.run_scenarios(client, values, explainer, options)
+        finally:
+            teardown_test_environment()
+
+    def run_scenarios(self, client, values, explainer, options):
+        with override_settings(API_CACHE_TIMEOUT=0):
+            for name, url in SCENARIOS:
+                status, queries = self.capture(client, url.format(**values))
+                self.stdout.write(
+                    self.style.MIGRATE_HEADING(
+                        f"{name} ({status}): запросов {len(queries)}"
+                    )
+                )
+                reported = set()
+                for sql, params in dict.fromkeys(queries):
+                    plan, problems = explainer(
+                        sql, params, options["analyze"]
+                    )
+                    if options["plans"]:
+                        self.stdout.write(f"  {sql}")
+                        self.stdout.write(
+                            "    " + plan.replace("\n", "\n    ")
+                        )
+                    self.report(
+                        name, sql, problems, options["min_rows"], reported
+                    )
+        self.propose()
+        self.report_redundant()
+
+    def report(self, scenario, sql, problems, min_rows, reported):
+        aliases, conditions, order, outer, main_table = parse_query(sql)
+        kinds = {kind for kind, *_ in problems}
+        for kind, table, estimated_rows, detail in problems:
+            table = aliases.get(table, table) if table else main_table
+            if table not in self.models or (kind, table) in reported:
+                continue
+            # Просмотр по порядку строк с LIMIT без сортировки
+            # останавливается на первых строках
+            if kind == "seq_scan" and "sort" not in kinds and (
+                "LIMIT" in outer and table == main_table
+            ):
+                continue
+            if max(estimated_rows or 0, self.size(table)) < min_rows:
+                continue
+            reported.add((kind, table))
+            columns = [(column, False) for column in conditions[table]]
+            if kind == "sort":
+                columns += [
+                    (column, descending)
+                    for order_table, column, descending in order
+                    if order_table == table
+                    and (column, False) not in columns
+                ]
+            message = "полный просмотр" if kind == "seq_scan" else detail
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  {table} ({self.size(table)} строк): {message}"
+                )
+            )
+            self.stdout.write(f"    {sql[:200]}...")
+            plain = [column for column, _ in columns]
+            if not plain:
+                self.stdout.write(
+                    "    индекс не поможет: нет условий и сортировки по "
+                    "столбцам этой таблицы"
+                )
+            elif covered(plain, self.indexes(table)):
+                self.stdout.write(
+                    f"    индекс по ({', '.join(plain)}) уже есть"
+                )
+            else:
+                self.suggestions.setdefault((table, tuple(columns)), scenario)
+
+    def propose(self):
+        """Напечатать операции миграций для недостающих индексов."""
+        if not self.suggestions:
+            self.stdout.write(
+                self.style.SUCCESS("Недостающих индексов не найдено.")
+            )
+            return
+        operation = (
+            "AddIndexConcurrently"
+            if connection.vendor == "postgresql"
+            else "AddIndex"
+        )
+        by_app = defaultdict(list)
+        for (table, columns), scenario in self.suggestions.items():
+            model = self.models[table]
+            fields = {
+                field.column: field.name for field in model._meta.fields
+            }
+            names = [
+                ("-" if descending else "") + fields.get(column, column)
+                for column, descending in columns
+            ]
+            by_app[model._meta.app_label].append(
+                f"        # {scenario}\n"
+                f"        {operation}(\n"
+                f"            model_name='{model._meta.model_name}',\n"
+                f"            index=models.Index(\n"
+                f"                fields={names!r},\n"
+                f"                name='{index_name(model, names)}',\n"
+                f"            ),\n"
+                f"        ),"
+            )
+        for app_label, operations in by_app.items():
+            self.stdout.write(
+                self.style.SUCCESS(f"Недостающие индексы {app_label}:")
+            )
+            self.stdout.write("\n".join(operations))
+        if connection.vendor == "postgresql":
+            self.stdout.write(
+                "AddIndexConcurrently из django.contrib.postgres.operations "
+                "требует atomic = False в миграции."
+            )
+
+    def report_redundant(self):
+        """Индексы, покрытые другими: лишняя работа при каждой записи."""
+        found = False
+        for table, model in sorted(self.models.items()):
+            # Индексы автотаблиц ManyToMany моделями не управляются
+            if (
+                model._meta.app_label not in AUDITED_APPS
+                or model._meta.auto_created
+            ):
+                continue
+            redundant = redundant_indexes(self.indexes(table))
+            for name, (columns, covering) in redundant.items():
+                if not found:
+                    self.stdout.write(
+                        self.style.SUCCESS("Избыточные индексы:")
+                    )
+                    found = True
+                field = next(
+                    (
+                        field
+                        for field in model._meta.fields
+                        if isinstance(field, models.ForeignKey)
+                        and (field.column,) == columns
+                    ),
+                    None,
+                )
+                fix = (
+                    f"db_index=False у {model.__name__}.{field.name}"
+                    if field is not None and field.db_index
+                    else f"RemoveIndex('{name}')"
+                )
+                self.stdout.write(
+                    f"  {table}.{name} ({', '.join(columns)}) покрыт "
+                    f"{', '.join(covering)}: {fix}"
+                )
+        if not found:
+            self.stdout.write(
+                self.style.SUCCESS("Избыточных индексов не найдено.")
+            )
@@ -0,0 +1,432 @@
+import base64
+import io
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.cache import get_cache
+from recipes.collection import add_recipes
+from recipes.management.commands.generate_dataset import PLACEHOLDER_PNG
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from users.models import User
+
+# Наборы данных по умолчанию: пользователей:рецептов через запятую
+DEFAULT_SIZES = "50:500,300:3000"
+
+# Сколько рецептов положить в корзину пользователя замера
+BENCHMARK_CART_SIZE = 10
+
+# Прогонов без замера перед замером: прогрев индексов и кэшей процесса
+BENCHMARK_WARMUP = 3
+
+# Меньше замеров p95 равен худшему замеру, и бюджет p95_ms не проверяется
+PERCENTILE_MIN_SAMPLES = 20
+
+# Бюджеты эндпоинтов: запросов к БД, p95 в мс, пик памяти в КБ.
+# Число запросов не должно зависеть от размера набора.
+BUDGETS = {
+    "recipes_list_anonymous": {"queries": 5, "p95_ms": 100, "memory_kb": 1024},
+    "recipes_list": {"queries": 5, "p95_ms": 100, "memory_kb": 1024},
+    "recipes_list_tags": {"queries": 5, "p95_ms": 100, "memory_kb": 1024},
+    "recipes_list_favorited": {"queries": 5, "p95_ms": 100, "memory_kb": 1024},
+    "recipes_list_search": {"queries": 5, "p95_ms": 100, "memory_kb": 1024},
+    "recipe_detail_anonymous": {"queries": 4, "p95_ms": 50, "memory_kb": 512},
+    "recipe_detail": {"queries": 4, "p95_ms": 50, "memory_kb": 512},
+    "ingredients_autocomplete": {"queries": 0, "p95_ms": 20, "memory_kb": 256},
+    "subscriptions": {"queries": 3, "p95_ms": 100, "memory_kb": 2048},
+    "download_shopping_cart": {"queries": 1, "p95_ms": 20, "memory_kb": 256},
+    "recipe_create": {"queries": 16, "p95_ms": 100, "memory_kb": 1024},
+    "recipe_update": {"queries": 10, "p95_ms": 100, "memory_kb": 1024},
+}
+
+
+def parse_sizes(value):
+    try:
+        sizes = [
+            tuple(int(number) for number in size.split(":"))
+            for size in value.split(",")
+        ]
+    except ValueError:
+        sizes = None
+    if not sizes or any(
+        len(size) != 2 or min(size) < 1 for size in sizes
+    ):
+        raise CommandError(
+            "--sizes: ожидается список пользователей:рецептов, "
+            "например 50:500,300:3000"
+        )
+    return sizes
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    return ordered[max(0, round(fraction * len(ordered)) - 1)]
+
+
+def consume(response):
+    """Дочитать ответ, в том числе потоковый."""
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Команда для замера эндпоинтов API с бюджетами."""
+
+    help = (
+        "Прогнать основные эндпоинты API через тестовый клиент на "
+        "сгенерированных наборах данных и проверить бюджеты запросов, "
+        "задержки и памяти"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=parse_sizes,
+            default=DEFAULT_SIZES,
+            help="Наборы данных: пользователей:рецептов через запятую",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Замеров каждого эндпоинта",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=BENCHMARK_WARMUP,
+            help="Прогонов каждого эндпоинта без замера перед замером",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--ingredients",
+            default=str(settings.BASE_DIR / "data" / "ingredients.csv"),
+            help="Файл каталога ингредиентов для load_ingredients",
+        )
+        parser.add_argument(
+            "--warm-cache",
+            action="store_true",
+            help="Мерить с включенным кэшем ответов API",
+        )
+        parser.add_argument(
+            "--budgets",
+            help="JSON-файл с бюджетами, дополняющими встроенные",
+        )
+        parser.add_argument(
+            "--latency-factor",
+            type=float,
+            default=1.0,
+            help="Множитель бюджетов задержки для медленных машин",
+        )
+        parser.add_argument("--output", help="Сохранить результаты в JSON")
+        parser.add_argument(
+            "--compare",
+            help="JSON прошлого прогона для сравнения",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations должен быть положительным")
+        if options["warmup"] < 0:
+            raise CommandError("--warmup не может быть отрицательным")
+        if options["iterations"] < PERCENTILE_MIN_SAMPLES:
+            self.stderr.write(
+                f"Замеров меньше {PERCENTILE_MIN_SAMPLES}: бюджеты p95_ms "
+                "не проверяются."
+            )
+        budgets = {name: dict(budget) for name, budget in BUDGETS.items()}
+        if options["budgets"]:
+            with open(options["budgets"]) as file:
+                for name, budget in json.load(file).items():
+                    budgets.setdefault(name, {}).update(budget)
+        for budget in budgets.values():
+            if "p95_ms" in budget:
+                budget["p95_ms"] *= options["latency_factor"]
+
+        report = {
+            "commit": current_commit(),
+            "created": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "warmup": options["warmup"],
+            "warm_cache": options["warm_cache"],
+            "datasets": [],
+        }
+        failures = []
+        setup_test_environment()
+        try:
+            for users, recipes in options["sizes"]:
+                results = self.run_dataset(users, recipes, options)
+                report["datasets"].append(
+                    {"users": users, "recipes": recipes, "results": results}
+                )
+                failures += self.check_budgets(
+                    f"{users}:{recipes}",
+                    results,
+                    budgets,
+                    options["iterations"] >= PERCENTILE_MIN_SAMPLES,
+                )
+        finally:
+            teardown_test_environment()
+        report["failures"] = failures
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+        if options["compare"]:
+            self.compare(options["compare"], report)
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f"Превышено бюджетов: {len(failures)}")
+        self.stdout.write(self.style.SUCCESS("Бюджеты соблюдены."))
+
+    def run_dataset(self, users, recipes, options):
+        """Создать тестовую базу, заполнить ее и замерить эндпоинты."""
+        self.stdout.write(f"Набор {users}:{recipes}...")
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            # Без --warm-cache кэш ответов отключен, чтобы каждый запрос
+            # доходил до сериализаторов и базы
+            with tempfile.TemporaryDirectory() as media_root, (
+                override_settings(
+                    MEDIA_ROOT=media_root,
+                    API_CACHE_TIMEOUT=(
+                        settings.API_CACHE_TIMEOUT
+                        if options["warm_cache"]
+                        else 0
+                    ),
+                )
+            ):
+                get_cache().clear()
+                call_command(
+                    "load_ingredients",
+                    path=options["ingredients"],
+                    stdout=io.StringIO(),
+                )
+                call_command(
+                    "generate_dataset",
+                    users=users,
+                    recipes=recipes,
+                    seed=options["seed"],
+                    stdout=io.StringIO(),
+                )
+                return {
+                    name: self.measure(request, options)
+                    for name, request in self.scenarios()
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def scenarios(self):
+        """Пары (имя, функция запроса) для текущего набора."""
+        user = User.objects.order_by("-following_count", "pk").first()
+        add_recipes(
+            ShoppingCart,
+            user.pk,
+            Recipe.objects.order_by("pk").values_list("pk", flat=True)[
+                :BENCHMARK_CART_SIZE
+            ],
+        )
+        recipe_id = (
+            Recipe.objects.order_by("-favorites_count", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        tag = Tag.objects.order_by("pk").first()
+        ingredient_ids = list(
+            Ingredient.objects.order_by("pk").values_list("pk", flat=True)[
+                :5
+            ]
+        )
+        prefix = (
+            Ingredient.objects.order_by("pk")
+            .values_list("name", flat=True)
+            .first()[:3]
+        )
+        payload = {
+            "ingredients": [
+                {"id": pk, "amount": amount}
+                for amount, pk in enumerate(ingredient_ids, 1)
+            ],
+            "tags": [tag.pk],
+            "image": "data:image/png;base64,"
+            + base64.b64encode(PLACEHOLDER_PNG).decode(),
+            "name": "Рецепт замера",
+            "text": "Текст рецепта замера",
+            "cooking_time": 10,
+        }
+        anonymous = APIClient()
+        client = APIClient()
+        client.force_authenticate(user)
+        created = client.post("/api/recipes/", payload, format="json")
+        if created.status_code != 201:
+            raise CommandError(
+                f"Не удалось создать рецепт замера: {created.content!r}"
+            )
+        own_recipe_id = created.json()["id"]
+        update = {
+            key: value for key, value in payload.items() if key != "image"
+        }
+        update["name"] = "Рецепт замера, правка"
+        return (
+            (
+                "recipes_list_anonymous",
+                lambda: anonymous.get("/api/recipes/"),
+            ),
+            ("recipes_list", lambda: client.get("/api/recipes/")),
+            (
+                "recipes_list_tags",
+                lambda: client.get("/api/recipes/", {"tags": tag.slug}),
+            ),
+            (
+                "recipes_list_favorited",
+                lambda: client.get("/api/recipes/", {"is_favorited": 1}),
+            ),
+            (
+                "recipes_list_search",
+                lambda: client.get("/api/recipes/", {"search": "суп"}),
+            ),
+            (
+                "recipe_detail_anonymous",
+                lambda: anonymous.get(f"/api/recipes/{recipe_id}/"),
+            ),
+            (
+                "recipe_detail",
+                lambda: client.get(f"/api/recipes/{recipe_id}/"),
+            ),
+            (
+                "ingredients_autocomplete",
+                lambda: anonymous.get("/api/ingredients/", {"name": prefix}),
+            ),
+            (
+                "subscriptions",
+                lambda: client.get("/api/users/subscriptions/"),
+            ),
+            (
+                "download_shopping_cart",
+                lambda: client.get("/api/recipes/download_shopping_cart/"),
+            ),
+            (
+                "recipe_create",
+                lambda: client.post("/api/recipes/", payload, format="json"),
+            ),
+            (
+                "recipe_update",
+                lambda: client.patch(
+                    f"/api/recipes/{own_recipe_id}/", update, format="json"
+                ),
+            ),
+        )
+
+    def measure(self, request, options):
+        """Задержки по iterations прогонам после warmup прогонов без
+        замера, затем запросы и память отдельным прогоном, чтобы учет не
+        искажал время."""
+
+        def call():
+            response = request()
+            consume(response)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{response.status_code}: {response.content[:200]!r}"
+                )
+
+        # Первый прогон строит индексы и кэши процесса, а на малом числе
+        # замеров p95 совпал бы с этим холодным прогоном
+        for _ in range(options["warmup"]):
+            call()
+        durations = []
+        for _ in range(options["iterations"]):
+            started = time.perf_counter()
+            call()
+            durations.append((time.perf_counter() - started) * 1000)
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            "p50_ms": round(statistics.median(durations), 3),
+            "p95_ms": round(percentile(durations, 0.95), 3),
+            "queries": len(queries),
+            "memory_kb": round(peak / 1024, 1),
+        }
+
+    def check_budgets(self, dataset, results, budgets, check_percentiles):
+        failures = []
+        for name, result in results.items():
+            self.stdout.write(
+                f"  {name}: p50 {result['p50_ms']:.1f} мс, "
+                f"p95 {result['p95_ms']:.1f} мс, "
+                f"{result['queries']} запросов, "
+                f"{result['memory_kb']:.0f} КБ"
+            )
+            for metric, limit in budgets.get(name, {}).items():
+                if metric.startswith("p95") and not check_percentiles:
+                    continue
+                if result[metric] > limit:
+                    failures.append(
+                        f"{dataset} {name}: {metric} {result[metric]} "
+                        f"> {limit:g}"
+                    )
+        return failures
+
+    def compare(self, path, report):
+        """Вывести изменения p95 и числа запросов относительно прогона."""
+        with open(path) as file:
+            baseline = json.load(file)
+        previous = {
+            (dataset["users"], dataset["recipes"], name): result
+            for dataset in baseline["datasets"]
+            for name, result in dataset["results"].items()
+        }
+        self.stdout.write(
+            f"Сравнение с {baseline.get('commit') or path} "
+            f"от {baseline.get('created', '?')}:"
+        )
+        for dataset in report["datasets"]:
+            for name, result in dataset["results"].items():
+                old = previous.get(
+                    (dataset["users"], dataset["recipes"], name)
+                )
+                if old is None:
+                    continue
+                self.stdout.write(
+                    f"  {dataset['users']}:{dataset['recipes']} {name}: "
+                    f"p95 {old['p95_ms']:.1f} -> {result['p95_ms']:.1f} мс, "
+                    f"запросов {old['queries']} -> {result['queries']}"
+                )
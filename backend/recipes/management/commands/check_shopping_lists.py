@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    """Команда для сверки материализованных списков покупок."""
+
+    help = "Сверить списки покупок с агрегатом по корзинам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Пересобрать списки с расхождениями",
+        )
+
+    def handle(self, *args, **options):
+        mismatched = shopping_list.find_mismatches()
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет."))
+            return
+        self.stdout.write(
+            self.style.WARNING(
+                f"Расхождения у пользователей: {len(mismatched)} "
+                f"({', '.join(map(str, sorted(mismatched)[:20]))})"
+            )
+        )
+        if options["fix"]:
+            with transaction.atomic():
+                shopping_list.rebuild(mismatched)
+            self.stdout.write(self.style.SUCCESS("Списки пересобраны."))
@@ -0,0 +1,511 @@
+import gzip
+import io
+import json
+import os
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+
+from api.signals import bump_on_commit, touch_on_commit
+from recipes import search, shopping_list, timeline
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag, TimelineEntry,
+)
+from recipes.sql import copy_from
+from users.models import Follow, User
+
+RecipeTag = Recipe.tags.through
+
+# Таблицы снимка в порядке загрузки: связанные после тех, на кого ссылаются
+SNAPSHOT_MODELS = (
+    User,
+    Tag,
+    Ingredient,
+    Recipe,
+    RecipeTag,
+    RecipeIngredient,
+    Favorite,
+    ShoppingCart,
+    Follow,
+    ShoppingListItem,
+    TimelineEntry,
+)
+
+# Теги, если в базе их еще нет
+DEFAULT_TAGS = (
+    ("Завтрак", "breakfast"),
+    ("Обед", "lunch"),
+    ("Ужин", "dinner"),
+    ("Десерт", "dessert"),
+)
+
+DISHES = (
+    "суп", "салат", "пирог", "рагу", "омлет", "плов", "соус", "десерт",
+    "суфле", "гуляш", "ризотто", "крем-суп", "смузи", "жаркое", "бульон",
+)
+ADJECTIVES = (
+    "домашний", "быстрый", "летний", "пряный", "сытный", "легкий",
+    "праздничный", "острый", "нежный", "деревенский", "зимний", "яркий",
+)
+FIRST_NAMES = ("Анна", "Иван", "Мария", "Петр", "Ольга", "Сергей", "Елена")
+LAST_NAMES = ("Иванова", "Петров", "Смирнова", "Кузнецов", "Попова")
+
+# Пароль и соль всех пользователей набора: хэш считается один раз
+DATASET_PASSWORD = "dataset123"
+DATASET_PASSWORD_SALT = "foodgramdataset"
+
+# Даты публикации равномерно в DATASET_PERIOD от DATASET_START
+DATASET_START = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+DATASET_PERIOD = timedelta(days=3 * 365)
+
+# Картинка-заглушка 1x1 для всех рецептов набора
+PLACEHOLDER_IMAGE = "recipes/images/dataset-placeholder.png"
+PLACEHOLDER_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753"
+    "de0000000c4944415478da63f8b0200000046401e1851587f40000000049454e"
+    "44ae426082"
+)
+
+# Размер пачки id пользователей при пересборке списков покупок
+SHOPPING_LIST_REBUILD_CHUNK = 500
+
+
+class SnapshotEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder обрезает время до миллисекунд, снимку нужны
+    микросекунды."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class ZipfSampler:
+    """Выборка из population с весами 1 / rank ** exponent.
+
+    Порядок популярности перемешивается генератором, чтобы популярность
+    не совпадала с порядком id.
+    """
+
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(
+            accumulate(
+                1 / rank ** exponent
+                for rank in range(1, len(self.population) + 1)
+            )
+        )
+
+    def sample(self, count, exclude=None):
+        """До count различных элементов, кроме exclude."""
+        count = min(count, len(self.population) - (exclude is not None))
+        if count <= 0:
+            return []
+        picked = dict.fromkeys(
+            self.rng.choices(
+                self.population, cum_weights=self.cum_weights, k=count * 2
+            )
+        )
+        picked.pop(exclude, None)
+        return list(islice(picked, count))
+
+
+@contextmanager
+def explicit_dates():
+    """Отключить auto_now и auto_now_add, чтобы записать даты набора."""
+    fields = [
+        field
+        for model in SNAPSHOT_MODELS
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Writer:
+    """Запись объектов пачками через bulk_create или COPY."""
+
+    def __init__(self, batch_size, use_copy):
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.counts = Counter()
+
+    def write(self, model, objects):
+        objects = iter(objects)
+        if self.use_copy:
+            fields = model._meta.concrete_fields
+            copy_from(
+                model._meta.db_table,
+                [field.column for field in fields],
+                self.rows(model, fields, objects),
+            )
+            return
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                return
+            model.objects.bulk_create(batch)
+            self.counts[model] += len(batch)
+
+    def rows(self, model, fields, objects):
+        for obj in objects:
+            self.counts[model] += 1
+            yield tuple(
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for field in fields
+            )
+
+
+def reset_sequences(models):
+    """Сдвинуть последовательности id после вставки с явными id."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def invalidate_caches():
+    """Данные записаны в обход сигналов: сбросить кэши API."""
+    bump_on_commit("recipes", "tags", "ingredients")
+    touch_on_commit("tags", "ingredients", "recipes_deleted")
+
+
+class Command(BaseCommand):
+    """Команда для генерации большого синтетического набора данных."""
+
+    help = (
+        "Сгенерировать пользователей, рецепты, избранное, корзины и "
+        "подписки с распределением Ципфа; сохранить или восстановить "
+        "снимок базы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--seed", type=int, default=1, help="Зерно генератора"
+        )
+        parser.add_argument(
+            "--favorites",
+            type=int,
+            default=20,
+            help="Среднее число рецептов в избранном пользователя",
+        )
+        parser.add_argument(
+            "--carts",
+            type=int,
+            default=3,
+            help="Среднее число рецептов в корзине пользователя",
+        )
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=10,
+            help="Среднее число подписок пользователя",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Показатель распределения Ципфа",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="PostgreSQL: писать через COPY вместо bulk_create",
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            "--dump",
+            metavar="DIR",
+            help="Сохранить снимок таблиц набора в каталог и выйти",
+        )
+        mode.add_argument(
+            "--restore",
+            metavar="DIR",
+            help="Заменить таблицы набора снимком из каталога",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy поддерживается только в PostgreSQL")
+        writer = Writer(options["batch_size"], options["copy"])
+        started = time.perf_counter()
+        if options["dump"]:
+            self.dump(options["dump"], options["batch_size"])
+            counts = self.dump_counts
+        else:
+            with transaction.atomic(), explicit_dates():
+                if options["restore"]:
+                    self.restore(options["restore"], writer)
+                else:
+                    self.generate(writer, options)
+                reset_sequences(SNAPSHOT_MODELS)
+                self.stdout.write("Поисковый индекс...")
+                search.rebuild()
+                invalidate_caches()
+            counts = writer.counts
+        elapsed = time.perf_counter() - started
+        for model, count in counts.items():
+            self.stdout.write(f"{model._meta.db_table}: {count}")
+        total = sum(counts.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: {total} строк за {elapsed:.1f} с "
+                f"({total / max(elapsed, 1e-9):.0f} строк/с)"
+            )
+        )
+
+    def generate(self, writer, options):
+        rng = random.Random(options["seed"])
+        ingredients = dict(Ingredient.objects.values_list("pk", "name"))
+        if not ingredients:
+            raise CommandError(
+                "Каталог ингредиентов пуст: сначала выполните "
+                "load_ingredients"
+            )
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS
+            )
+        tag_ids = sorted(Tag.objects.values_list("pk", flat=True))
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            default_storage.save(
+                PLACEHOLDER_IMAGE, ContentFile(PLACEHOLDER_PNG)
+            )
+
+        first_user = (User.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+        first_recipe = (
+            Recipe.objects.aggregate(last=Max("pk"))["last"] or 0
+        ) + 1
+        user_ids = range(first_user, first_user + options["users"])
+        recipe_ids = range(first_recipe, first_recipe + options["recipes"])
+        if not user_ids:
+            raise CommandError("--users должен быть положительным")
+
+        self.stdout.write("Пользователи...")
+        password = make_password(DATASET_PASSWORD, DATASET_PASSWORD_SALT)
+        writer.write(
+            User,
+            (
+                User(
+                    pk=pk,
+                    username=f"user{pk}",
+                    email=f"user{pk}@example.com",
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES),
+                    password=password,
+                    date_joined=DATASET_START,
+                )
+                for pk in user_ids
+            ),
+        )
+
+        exponent = options["zipf"]
+        authors = ZipfSampler(rng, user_ids, exponent)
+        ingredient_sampler = ZipfSampler(rng, ingredients, exponent)
+        tag_sampler = ZipfSampler(rng, tag_ids, exponent)
+        recipe_ingredients = {}
+
+        def recipes():
+            for pk in recipe_ids:
+                (author_id,) = authors.sample(1)
+                chosen = ingredient_sampler.sample(rng.randint(3, 12))
+                recipe_ingredients[pk] = chosen
+                cooking_time = rng.randint(5, 180)
+                name = (
+                    f"{rng.choice(ADJECTIVES).capitalize()} "
+                    f"{rng.choice(DISHES)}"
+                )
+                pub_date = DATASET_START + DATASET_PERIOD * rng.random()
+                yield Recipe(
+                    pk=pk,
+                    author_id=author_id,
+                    name=name,
+                    image=PLACEHOLDER_IMAGE,
+                    text=(
+                        f"{name}. Понадобятся: "
+                        + ", ".join(ingredients[i] for i in chosen)
+                        + f". Готовится {cooking_time} минут."
+                    ),
+                    cooking_time=cooking_time,
+                    pub_date=pub_date,
+                    updated_at=pub_date,
+                )
+
+        def recipe_rows():
+            # Рецепты и их строки пишутся пачками, чтобы не держать в
+            # памяти весь набор
+            source = recipes()
+            while True:
+                batch = list(islice(source, writer.batch_size))
+                if not batch:
+                    return
+                yield batch
+
+        self.stdout.write("Рецепты, ингредиенты и теги рецептов...")
+        for batch in recipe_rows():
+            writer.write(Recipe, batch)
+            writer.write(
+                RecipeIngredient,
+                (
+                    RecipeIngredient(
+                        recipe_id=recipe.pk,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+                    for recipe in batch
+                    for ingredient_id in recipe_ingredients.pop(recipe.pk)
+                ),
+            )
+            writer.write(
+                RecipeTag,
+                (
+                    RecipeTag(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe in batch
+                    for tag_id in tag_sampler.sample(rng.randint(1, 3))
+                ),
+            )
+
+        if recipe_ids:
+            recipe_sampler = ZipfSampler(rng, recipe_ids, exponent)
+            for model, average in (
+                (Favorite, options["favorites"]),
+                (ShoppingCart, options["carts"]),
+            ):
+                self.stdout.write(f"{model._meta.verbose_name_plural}...")
+                writer.write(
+                    model,
+                    (
+                        model(user_id=user_id, recipe_id=recipe_id)
+                        for user_id in user_ids
+                        for recipe_id in recipe_sampler.sample(
+                            rng.randint(0, 2 * average)
+                        )
+                    ),
+                )
+        self.stdout.write("Подписки...")
+        writer.write(
+            Follow,
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in authors.sample(
+                    rng.randint(0, 2 * options["follows"]), exclude=user_id
+                )
+            ),
+        )
+
+        self.stdout.write("Счетчики, списки покупок и ленты...")
+        call_command("recount", stdout=io.StringIO())
+        for start in range(
+            0, len(user_ids), SHOPPING_LIST_REBUILD_CHUNK
+        ):
+            shopping_list.rebuild(
+                user_ids[start:start + SHOPPING_LIST_REBUILD_CHUNK]
+            )
+        timeline.rebuild()
+
+    def dump(self, directory, batch_size):
+        """Сохранить таблицы набора в каталог: по файлу JSON Lines на
+        таблицу и manifest.json с их списком."""
+        os.makedirs(directory, exist_ok=True)
+        self.dump_counts = Counter()
+        for model in SNAPSHOT_MODELS:
+            attnames = [field.attname for field in model._meta.concrete_fields]
+            path = os.path.join(directory, f"{model._meta.db_table}.jsonl.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as file:
+                file.write(json.dumps(attnames) + "\n")
+                for row in (
+                    model.objects.order_by("pk")
+                    .values_list(*attnames)
+                    .iterator(chunk_size=batch_size)
+                ):
+                    file.write(
+                        json.dumps(
+                            row, cls=SnapshotEncoder, ensure_ascii=False
+                        )
+                        + "\n"
+                    )
+                    self.dump_counts[model] += 1
+        with open(os.path.join(directory, "manifest.json"), "w") as file:
+            json.dump(
+                {
+                    "tables": [
+                        model._meta.db_table for model in SNAPSHOT_MODELS
+                    ],
+                    "counts": {
+                        model._meta.db_table: count
+                        for model, count in self.dump_counts.items()
+                    },
+                },
+                file,
+                indent=2,
+            )
+
+    def restore(self, directory, writer):
+        """Очистить таблицы набора и загрузить их из снимка."""
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise CommandError(f"Снимок {directory} не найден")
+        with open(manifest_path) as file:
+            tables = json.load(file)["tables"]
+        expected = [model._meta.db_table for model in SNAPSHOT_MODELS]
+        if tables != expected:
+            raise CommandError("Снимок сделан для другой схемы таблиц")
+        connection.ops.execute_sql_flush(
+            connection.ops.sql_flush(
+                no_style(), expected, allow_cascade=True
+            )
+        )
+        for model in SNAPSHOT_MODELS:
+            self.stdout.write(f"{model._meta.db_table}...")
+            path = os.path.join(directory, f"{model._meta.db_table}.jsonl.gz")
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                by_attname = {
+                    field.attname: field
+                    for field in model._meta.concrete_fields
+                }
+                fields = [
+                    by_attname[attname] for attname in json.loads(next(file))
+                ]
+                writer.write(
+                    model,
+                    (
+                        model(
+                            **{
+                                field.attname: field.to_python(value)
+                                for field, value in zip(
+                                    fields, json.loads(line)
+                                )
+                            }
+                        )
+                        for line in file
+                    ),
+                )
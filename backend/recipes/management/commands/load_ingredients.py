@@ -1,23 +1,146 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.signals import bump_on_commit, touch_on_commit
+from recipes.constants import (
+    INGREDIENT_MAX_LENGTH, MEASUREMENT_UNIT_MAX_LENGTH,
+)
 from recipes.models import Ingredient
+from recipes.sql import copy_from
+
+# Размер пачки строк по умолчанию
+DEFAULT_BATCH_SIZE = 1000
+
+# Размер блока чтения JSON-файла
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Сколько новых ингредиентов показывать в --dry-run
+DRY_RUN_SAMPLE_SIZE = 20
+
+
+def detect_format(file):
+    """Формат по первому значимому символу файла: [ — JSON, иначе CSV."""
+    position = file.tell()
+    head = file.read(JSON_CHUNK_SIZE).lstrip(" \t\r\n")
+    file.seek(position)
+    return "json" if head.startswith("[") else "csv"
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) == 2:
+            yield row
+        else:
+            yield None
+
+
+def read_json(file):
+    """Элементы JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in (
+                " \t\r\n,"
+            ):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise CommandError("Ожидался JSON-массив")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError("Некорректный JSON")
+                break
+            if isinstance(item, dict):
+                yield item.get("name"), item.get("measurement_unit")
+            elif isinstance(item, list) and len(item) == 2:
+                yield item
+            else:
+                yield None
+        if not chunk:
+            return
+
+
+def clean_rows(rows, stats):
+    """Нормализованные пары (name, measurement_unit), мусор отбрасывается."""
+    for row in rows:
+        stats["rows"] += 1
+        if row is None:
+            stats["invalid"] += 1
+            continue
+        name, measurement_unit = row
+        if not isinstance(name, str) or not isinstance(measurement_unit, str):
+            stats["invalid"] += 1
+            continue
+        name, measurement_unit = name.strip(), measurement_unit.strip()
+        if (
+            not name
+            or not measurement_unit
+            or len(name) > INGREDIENT_MAX_LENGTH
+            or len(measurement_unit) > MEASUREMENT_UNIT_MAX_LENGTH
+        ):
+            stats["invalid"] += 1
+            continue
+        yield name, measurement_unit
 
 
 class Command(BaseCommand):
-    """Команда для загрузки ингредиентов из CSV файла."""
+    """Команда для загрузки ингредиентов из CSV или JSON файла."""
 
-    help = "Загрузить ингредиенты из CSV файла"
+    help = (
+        "Загрузить ингредиенты из CSV или JSON файла пачками, "
+        "пропуская уже существующие"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--path",
             type=str,
-            help="Путь к CSV файлу с ингредиентами",
+            help="Путь к CSV или JSON файлу с ингредиентами",
             default="/app/data/ingredients.csv",
         )
+        parser.add_argument(
+            "--format",
+            choices=("auto", "csv", "json"),
+            default="auto",
+            help="Формат файла (по умолчанию определяется по содержимому)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Количество строк в одном INSERT",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="PostgreSQL: загрузить через COPY во временную таблицу",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только сравнить файл с каталогом, ничего не записывая",
+        )
 
     def handle(self, *args, **options):
         file_path = options["path"]
@@ -25,32 +148,85 @@ class Command(BaseCommand):
         if not os.path.exists(file_path):
             self.stdout.write(self.style.ERROR(f"Файл {file_path} не найден"))
             return
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy поддерживается только в PostgreSQL")
 
-        ingredients_created = 0
-        ingredients_skipped = 0
-
-        with open(file_path, "r", encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile)
-
-            for row in reader:
-                if len(row) != 2:
-                    continue
-
-                name, measurement_unit = row
-
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=measurement_unit
-                )
-
-                if created:
-                    ingredients_created += 1
+        stats = {"rows": 0, "invalid": 0}
+        started = time.perf_counter()
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as file:
+            file_format = options["format"]
+            if file_format == "auto":
+                file_format = detect_format(file)
+            reader = read_json if file_format == "json" else read_csv
+            rows = clean_rows(reader(file), stats)
+            if options["dry_run"]:
+                self.dry_run(rows)
+                return
+            with transaction.atomic():
+                before = Ingredient.objects.count()
+                if options["copy"]:
+                    self.load_copy(rows)
                 else:
-                    ingredients_skipped += 1
+                    self.load_batches(rows, options["batch_size"])
+                created = Ingredient.objects.count() - before
+                if created:
+                    # bulk_create и COPY не шлют post_save
+                    bump_on_commit("ingredients")
+                    touch_on_commit("ingredients")
+        elapsed = time.perf_counter() - started
 
         self.stdout.write(
             self.style.SUCCESS(
                 f"Загрузка завершена. "
-                f"Создано: {ingredients_created}, "
-                f"Пропущено: {ingredients_skipped}"
+                f"Создано: {created}, "
+                f"Пропущено: {stats['rows'] - stats['invalid'] - created}, "
+                f"Некорректных строк: {stats['invalid']}. "
+                f"{stats['rows']} строк за {elapsed:.2f} с "
+                f"({stats['rows'] / max(elapsed, 1e-9):.0f} строк/с)"
             )
         )
+
+    def load_batches(self, rows, batch_size):
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                return
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def load_copy(self, rows):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE ingredient_staging "
+                "(name text, measurement_unit text) ON COMMIT DROP"
+            )
+            copy_from(
+                "ingredient_staging", ("name", "measurement_unit"), rows
+            )
+            cursor.execute(
+                "INSERT INTO recipes_ingredient (name, measurement_unit) "
+                "SELECT DISTINCT name, measurement_unit "
+                "FROM ingredient_staging "
+                "ON CONFLICT (name, measurement_unit) DO NOTHING"
+            )
+
+    def dry_run(self, rows):
+        incoming = set(rows)
+        existing = set(
+            Ingredient.objects.values_list("name", "measurement_unit")
+        )
+        new = sorted(incoming - existing)
+        self.stdout.write(
+            f"В файле: {len(incoming)} уникальных ингредиентов. "
+            f"Новых: {len(new)}, уже в каталоге: "
+            f"{len(incoming & existing)}, есть только в каталоге: "
+            f"{len(existing - incoming)}."
+        )
+        for name, measurement_unit in new[:DRY_RUN_SAMPLE_SIZE]:
+            self.stdout.write(f"+ {name} ({measurement_unit})")
+        if len(new) > DRY_RUN_SAMPLE_SIZE:
+            self.stdout.write(f"... и еще {len(new) - DRY_RUN_SAMPLE_SIZE}")
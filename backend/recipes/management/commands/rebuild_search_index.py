@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    """Команда для пересборки поискового индекса рецептов."""
+
+    help = "Пересчитать поисковые документы всех рецептов"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        total = search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Поисковый индекс пересобран: {total}.")
+        )
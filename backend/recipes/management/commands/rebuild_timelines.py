@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import timeline
+
+
+class Command(BaseCommand):
+    """Команда для пересборки лент подписок."""
+
+    help = "Пересобрать ленты подписок по текущим подпискам"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        total = timeline.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Ленты пересобраны, записей: {total}.")
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# Денормализованные счетчики: модель, поле, считаемый queryset и его поле
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite.objects.all(), "recipe"),
+    (Recipe, "shopping_cart_count", ShoppingCart.objects.all(), "recipe"),
+    (User, "recipes_count", Recipe.objects.all(), "author"),
+    (User, "followers_count", Follow.objects.all(), "author"),
+    (User, "following_count", Follow.objects.all(), "user"),
+)
+
+
+class Command(BaseCommand):
+    """Команда для пересчета денормализованных счетчиков."""
+
+    help = "Пересчитать счетчики избранного, покупок, рецептов и подписок"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, counted_queryset, counted_field in COUNTERS:
+            fixed = recount(
+                model.objects.all(), field, counted_queryset, counted_field
+            )
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}.{field}: "
+                f"исправлено {fixed}"
+            )
+        self.stdout.write(self.style.SUCCESS("Счетчики пересчитаны."))
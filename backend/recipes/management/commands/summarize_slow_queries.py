@@ -0,0 +1,117 @@
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Поля, по которым можно упорядочить отпечатки
+SORT_FIELDS = ("total", "count", "max", "mean")
+
+
+class Command(BaseCommand):
+    """Команда для сводки журнала медленных запросов по отпечаткам."""
+
+    help = "Показать самые дорогие медленные запросы из журнала"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=settings.SLOW_QUERY_LOG_FILE,
+            help="Журнал; ротированные файлы .1, .2, ... читаются тоже",
+        )
+        parser.add_argument(
+            "--top", type=int, default=10, help="Сколько отпечатков вывести"
+        )
+        parser.add_argument(
+            "--sort",
+            choices=SORT_FIELDS,
+            default="total",
+            help="Порядок: суммарное, число, максимум или среднее время",
+        )
+        parser.add_argument(
+            "--since",
+            type=datetime.fromisoformat,
+            help="Только записи не раньше момента ISO 8601 (UTC)",
+        )
+        parser.add_argument(
+            "--view",
+            help="Только запросы представления, например RecipeViewSet.list",
+        )
+
+    def read_entries(self, path):
+        paths = [path] + [
+            f"{path}.{number}"
+            for number in range(1, settings.SLOW_QUERY_LOG_BACKUP_COUNT + 1)
+        ]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            raise CommandError(f"Журнал не найден: {path}")
+        for path in paths:
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        groups = defaultdict(
+            lambda: {
+                "durations": [],
+                "views": Counter(),
+                "stacks": Counter(),
+                "sql": "",
+                "plan": None,
+            }
+        )
+        for entry in self.read_entries(options["path"]):
+            if options["view"] and entry.get("view") != options["view"]:
+                continue
+            if since and datetime.fromisoformat(entry["time"]) < since:
+                continue
+            group = groups[entry["fingerprint"]]
+            group["durations"].append(entry["duration_ms"])
+            group["views"][entry.get("view") or "-"] += 1
+            group["stacks"][" < ".join(reversed(entry["stack"][-3:]))] += 1
+            if entry["duration_ms"] >= max(group["durations"]):
+                group["sql"] = entry["sql"]
+                group["plan"] = entry.get("plan")
+        if not groups:
+            self.stdout.write("Медленных запросов нет.")
+            return
+
+        for group in groups.values():
+            durations = group["durations"]
+            group["count"] = len(durations)
+            group["total"] = sum(durations)
+            group["max"] = max(durations)
+            group["mean"] = group["total"] / group["count"]
+        ranked = sorted(
+            groups.items(),
+            key=lambda item: item[1][options["sort"]],
+            reverse=True,
+        )
+        for fingerprint, group in ranked[: options["top"]]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{fingerprint}: {group['count']} раз, всего "
+                    f"{group['total']:.0f} мс, среднее "
+                    f"{group['mean']:.0f} мс, максимум {group['max']:.0f} мс"
+                )
+            )
+            views = ", ".join(
+                f"{view} ({count})"
+                for view, count in group["views"].most_common(3)
+            )
+            self.stdout.write(f"  Представления: {views}")
+            stack, _ = group["stacks"].most_common(1)[0]
+            self.stdout.write(f"  Стек: {stack or '-'}")
+            self.stdout.write(f"  SQL: {group['sql'][:500]}")
+            if group["plan"]:
+                for line in group["plan"].splitlines():
+                    self.stdout.write(f"    {line}")
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Значения на момент миграции (см. recipes.constants)
+TIMELINE_BACKFILL_LIMIT = 50
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+
+
+def fill_timeline(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    follows = Follow.objects.filter(
+        author__followers_count__lte=TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        recipes = Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:TIMELINE_BACKFILL_LIMIT]
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in recipes
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_timelineentry'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# Значения на момент миграции (см. recipes.constants)
+SEARCH_CONFIG = 'russian'
+SEARCH_FTS_TABLE = 'recipes_recipe_fts'
+
+INGREDIENTS_SUBQUERY = (
+    "SELECT {aggregate} FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = recipes_recipe.id"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """Поисковый индекс рецептов под СУБД.
+
+    PostgreSQL: столбец tsvector с GIN-индексом. SQLite: таблица FTS5.
+    Столбец не описан в модели, чтобы модели не зависели от
+    django.contrib.postgres.
+    """
+    execute = schema_editor.execute
+    if schema_editor.connection.vendor == 'postgresql':
+        execute('ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector')
+        execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING gin (search_vector)'
+        )
+        execute(
+            "UPDATE recipes_recipe SET search_vector = "
+            "setweight(to_tsvector(%s, name), 'A') || "
+            "setweight(to_tsvector(%s, coalesce(("
+            + INGREDIENTS_SUBQUERY.format(
+                aggregate="string_agg(i.name, ' ')"
+            )
+            + "), '')), 'B') || setweight(to_tsvector(%s, text), 'C')",
+            [SEARCH_CONFIG] * 3,
+        )
+    elif schema_editor.connection.vendor == 'sqlite':
+        execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_FTS_TABLE} USING fts5('
+            f"name, ingredients, text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        execute(
+            f'INSERT INTO {SEARCH_FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT id, name, coalesce(('
+            + INGREDIENTS_SUBQUERY.format(
+                aggregate="group_concat(i.name, ' ')"
+            )
+            + "), ''), text FROM recipes_recipe"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN search_vector'
+        )
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {SEARCH_FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_fill_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,12 +1,14 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch
 
-from users.models import User
+from users.models import Follow, User
 
 from .constants import (
     INGREDIENT_MAX_LENGTH, MEASUREMENT_UNIT_MAX_LENGTH, MIN_COOKING_TIME,
     MIN_INGREDIENTS_COUNT, RECIPE_MAX_LENGTH, TAG_MAX_LENGTH,
 )
+from .counters import CounterFieldsMixin
 
 
 class Tag(models.Model):
@@ -69,14 +71,51 @@ class Ingredient(models.Model):
         return f"{self.name}, {self.measurement_unit}"
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов с заготовками для чтения через API."""
+
+    def with_related(self):
+        """Подгрузить автора, теги и ингредиенты фиксированным числом
+        запросов."""
+        return self.select_related("author").prefetch_related(
+            "tags",
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотировать флаги избранного, корзины и подписки на автора."""
+        if not user or user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_author_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef("author"))
+            ),
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецепта."""
 
+    counter_fields = ("favorites_count", "shopping_cart_count")
+
+    # Поиск по автору покрывает recipe_author_pub_date_idx
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="recipes",
         verbose_name="Автор",
+        db_index=False,
     )
     name = models.CharField(
         "Название",
@@ -117,11 +156,33 @@ class Recipe(models.Model):
         "Дата публикации",
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        "Дата изменения",
+        auto_now=True,
+        db_index=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        "В избранном", default=0, editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        "В списках покупок", default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -130,11 +191,13 @@ class Recipe(models.Model):
 class RecipeIngredient(models.Model):
     """Модель связи рецепта и ингредиента с количеством."""
 
+    # Поиск по рецепту покрывает unique_recipe_ingredient
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name="recipe_ingredients",
         verbose_name="Рецепт",
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -172,11 +235,13 @@ class RecipeIngredient(models.Model):
 class Favorite(models.Model):
     """Модель избранного."""
 
+    # Поиск по пользователю покрывает unique_favorite
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="favorites",
         verbose_name="Пользователь",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -201,11 +266,13 @@ class Favorite(models.Model):
 class ShoppingCart(models.Model):
     """Модель списка покупок."""
 
+    # Поиск по пользователю покрывает unique_shopping_cart
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="shopping_cart",
         verbose_name="Пользователь",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -225,3 +292,93 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"{self.user} добавил в покупки {self.recipe}"
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается инкрементально при изменении корзины и ингредиентов
+    рецептов, лежащих в корзине (см. recipes.shopping_list).
+    """
+
+    # Поиск по пользователю покрывает unique_shopping_list_item
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Пользователь",
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.PositiveIntegerField("Общее количество")
+
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Позиции списка покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shopping_list_item",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient} — {self.total_amount}"
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика автора.
+
+    Заполняется при публикации рецепта и при подписке, очищается при
+    отписке (см. recipes.timeline). Дата публикации продублирована,
+    чтобы лента читалась по индексу без соединения с рецептами.
+    """
+
+    # Поиск по пользователю покрывает timeline_user_pub_date_idx
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Подписчик",
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        ordering = ["-pub_date", "-recipe"]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="timeline_user_pub_date_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="timeline_user_author_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_timeline_entry"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} в ленте {self.user}"
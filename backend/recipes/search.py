@@ -0,0 +1,172 @@
+import re
+import threading
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .constants import (
+    SEARCH_BATCH_SIZE, SEARCH_CONFIG, SEARCH_FTS_TABLE, SEARCH_RANK_WEIGHTS,
+)
+from .models import Recipe
+
+# Слова запроса для FTS5: буквы и цифры, остальное отбрасывается
+FTS_WORD_RE = re.compile(r"\w+")
+
+# Текст ингредиентов рецепта одной строкой
+INGREDIENTS_SUBQUERY = (
+    "SELECT {aggregate} FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = recipes_recipe.id"
+)
+
+POSTGRESQL_DOCUMENT = (
+    "setweight(to_tsvector(%s, recipes_recipe.name), 'A') || "
+    "setweight(to_tsvector(%s, coalesce(("
+    + INGREDIENTS_SUBQUERY.format(aggregate="string_agg(i.name, ' ')")
+    + "), '')), 'B') || "
+    "setweight(to_tsvector(%s, recipes_recipe.text), 'C')"
+)
+
+pending = threading.local()
+
+
+def is_postgresql():
+    return connection.vendor == "postgresql"
+
+
+def placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def update_documents(recipe_ids):
+    """Пересчитать поисковые документы рецептов.
+
+    В PostgreSQL это столбец search_vector с GIN-индексом, в SQLite —
+    строка таблицы FTS5. Документы удаленных рецептов в SQLite
+    удаляются, в PostgreSQL уходят вместе со строкой рецепта.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if is_postgresql():
+            cursor.execute(
+                f"UPDATE recipes_recipe SET search_vector = "
+                f"{POSTGRESQL_DOCUMENT} "
+                f"WHERE recipes_recipe.id IN ({placeholders(recipe_ids)})",
+                [SEARCH_CONFIG] * 3 + recipe_ids,
+            )
+            return
+        cursor.execute(
+            f"DELETE FROM {SEARCH_FTS_TABLE} "
+            f"WHERE rowid IN ({placeholders(recipe_ids)})",
+            recipe_ids,
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_FTS_TABLE} "
+            f"(rowid, name, ingredients, text) "
+            f"SELECT recipes_recipe.id, recipes_recipe.name, coalesce(("
+            + INGREDIENTS_SUBQUERY.format(
+                aggregate="group_concat(i.name, ' ')"
+            )
+            + f"), ''), recipes_recipe.text FROM recipes_recipe "
+            f"WHERE recipes_recipe.id IN ({placeholders(recipe_ids)})",
+            recipe_ids,
+        )
+
+
+def flush():
+    recipe_ids = getattr(pending, "recipe_ids", None)
+    if recipe_ids:
+        pending.recipe_ids = set()
+        update_documents(recipe_ids)
+
+
+def schedule_update(recipe_ids):
+    """Пересчитать документы рецептов после фиксации транзакции.
+
+    К этому моменту ингредиенты рецепта уже сохранены, а изменения
+    нескольких строк одного рецепта схлопываются в один пересчет.
+    """
+    if not hasattr(pending, "recipe_ids"):
+        pending.recipe_ids = set()
+    pending.recipe_ids.update(recipe_ids)
+    transaction.on_commit(flush)
+
+
+def rebuild():
+    """Пересчитать документы всех рецептов.
+
+    Возвращает количество рецептов.
+    """
+    recipe_ids = list(Recipe.objects.values_list("pk", flat=True))
+    if not is_postgresql():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_FTS_TABLE}")
+    for start in range(0, len(recipe_ids), SEARCH_BATCH_SIZE):
+        update_documents(recipe_ids[start:start + SEARCH_BATCH_SIZE])
+    return len(recipe_ids)
+
+
+def fts_query(query):
+    """Запрос FTS5 из пользовательской строки.
+
+    Каждое слово ищется по префиксу, что заменяет стемминг, которого
+    в токенизаторе unicode61 нет.
+    """
+    words = FTS_WORD_RE.findall(query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def matches(query):
+    """Условие на рецепты, подходящие под запрос, или None."""
+    if is_postgresql():
+        if not query.strip():
+            return None
+        return Q(
+            pk__in=RawSQL(
+                "SELECT id FROM recipes_recipe "
+                "WHERE search_vector @@ websearch_to_tsquery(%s, %s)",
+                (SEARCH_CONFIG, query),
+            )
+        )
+    query = fts_query(query)
+    if not query:
+        return None
+    return Q(
+        pk__in=RawSQL(
+            f"SELECT rowid FROM {SEARCH_FTS_TABLE} "
+            f"WHERE {SEARCH_FTS_TABLE} MATCH %s",
+            (query,),
+        )
+    )
+
+
+def rank(query):
+    """Релевантность рецепта запросу: чем больше, тем выше."""
+    if is_postgresql():
+        return RawSQL(
+            "ts_rank(recipes_recipe.search_vector, "
+            "websearch_to_tsquery(%s, %s))",
+            (SEARCH_CONFIG, query),
+        )
+    weights = ", ".join(str(weight) for weight in SEARCH_RANK_WEIGHTS)
+    return RawSQL(
+        f"-(SELECT bm25({SEARCH_FTS_TABLE}, {weights}) "
+        f"FROM {SEARCH_FTS_TABLE} WHERE {SEARCH_FTS_TABLE} MATCH %s "
+        f"AND rowid = recipes_recipe.id)",
+        (fts_query(query),),
+    )
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности."""
+    condition = matches(query)
+    if condition is None:
+        return queryset
+    return (
+        queryset.filter(condition)
+        .annotate(search_rank=rank(query))
+        .order_by("-search_rank", "-pub_date", "-id")
+    )
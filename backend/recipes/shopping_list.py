@@ -0,0 +1,165 @@
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from users.models import User
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+# Размер пачки при массовой вставке позиций списка покупок
+BATCH_SIZE = 1000
+
+
+def materialized_shopping_list(user):
+    """Список покупок из материализованной таблицы."""
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "total_amount",
+        )
+        .order_by("ingredient__name")
+    )
+
+
+def recipe_amounts(recipe_ids):
+    """Суммарные количества ингредиентов рецептов."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values_list("ingredient_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+
+
+def apply_deltas(user_ids, deltas):
+    """Прибавить к спискам покупок пользователей изменения количеств.
+
+    deltas — словарь {ingredient_id: delta}. Недостающие позиции
+    создаются, обнулившиеся удаляются, версия списков увеличивается.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if any(delta > 0 for delta in deltas.values()):
+        user_ids = list(user_ids)
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=pk, total_amount=0
+                )
+                for user_id in user_ids
+                for pk, delta in deltas.items()
+                if delta > 0
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    items.update(
+        total_amount=Greatest(
+            F("total_amount")
+            + Case(
+                *(
+                    When(ingredient_id=pk, then=Value(delta))
+                    for pk, delta in deltas.items()
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+    )
+    items.filter(total_amount=0).delete()
+    User.objects.filter(pk__in=user_ids).update(
+        shopping_list_version=F("shopping_list_version") + 1
+    )
+
+
+def add_recipes(user_id, recipe_ids):
+    """Учесть рецепты, добавленные в корзину пользователя."""
+    apply_deltas([user_id], recipe_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Учесть рецепты, убранные из корзины пользователя."""
+    apply_deltas(
+        [user_id],
+        {pk: -amount for pk, amount in recipe_amounts(recipe_ids).items()},
+    )
+
+
+def change_recipe_ingredients(recipe, old_amounts, new_amounts):
+    """Учесть правку ингредиентов рецепта во всех корзинах с ним."""
+    apply_deltas(
+        ShoppingCart.objects.filter(recipe=recipe).values_list(
+            "user_id", flat=True
+        ),
+        {
+            pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+            for pk in old_amounts.keys() | new_amounts.keys()
+        },
+    )
+
+
+def rebuild(user_ids):
+    """Пересобрать списки покупок пользователей из корзин."""
+    user_ids = list(user_ids)
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=pk, total_amount=total
+            )
+            for user_id, pk, total in RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user_id__in=user_ids
+            )
+            .values_list("recipe__shopping_cart__user_id", "ingredient_id")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    User.objects.filter(pk__in=user_ids).update(
+        shopping_list_version=F("shopping_list_version") + 1
+    )
+
+
+def find_mismatches():
+    """Пользователи, у которых список покупок расходится с корзиной.
+
+    Живой агрегат и материализованная таблица читаются курсорами в
+    одном порядке и сливаются, поэтому память не растет с объемом.
+    """
+    live = iter(
+        RecipeIngredient.objects.filter(recipe__shopping_cart__isnull=False)
+        .values_list("recipe__shopping_cart__user_id", "ingredient_id")
+        .annotate(total=Sum("amount"))
+        .order_by("recipe__shopping_cart__user_id", "ingredient_id")
+        .iterator()
+    )
+    stored = iter(
+        ShoppingListItem.objects.values_list(
+            "user_id", "ingredient_id", "total_amount"
+        )
+        .order_by("user_id", "ingredient_id")
+        .iterator()
+    )
+    mismatched = set()
+    live_row, stored_row = next(live, None), next(stored, None)
+    while live_row is not None or stored_row is not None:
+        if stored_row is None or (
+            live_row is not None and live_row[:2] < stored_row[:2]
+        ):
+            mismatched.add(live_row[0])
+            live_row = next(live, None)
+        elif live_row is None or stored_row[:2] < live_row[:2]:
+            mismatched.add(stored_row[0])
+            stored_row = next(stored, None)
+        else:
+            if live_row[2] != stored_row[2]:
+                mismatched.add(live_row[0])
+            live_row, stored_row = next(live, None), next(stored, None)
+    return mismatched
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from . import search, shopping_list, timeline
+from .collection import RECIPE_COUNTERS, recipes_added
+from .counters import change_counter
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_to_collection(sender, instance, created, raw, **kwargs):
+    """Увеличить счетчик рецепта и дополнить список покупок."""
+    if created and not raw:
+        recipes_added(sender, instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """Уменьшить счетчик рецепта при удалении из коллекции."""
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id),
+        RECIPE_COUNTERS[sender],
+        -1,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, raw, **kwargs):
+    """Увеличить счетчик рецептов автора."""
+    if created and not raw:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), "recipes_count", 1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw, **kwargs):
+    """Разослать новый рецепт по лентам подписчиков после фиксации."""
+    if created and not raw:
+        transaction.on_commit(lambda: timeline.fan_out(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Уменьшить счетчик рецептов автора."""
+    change_counter(
+        User.objects.filter(pk=instance.author_id), "recipes_count", -1
+    )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """Вычесть ингредиенты рецепта из списка покупок.
+
+    pre_delete, а не post_delete: при каскадном удалении рецепта его
+    ингредиенты к post_delete корзины уже могут быть удалены.
+    """
+    shopping_list.remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_search_document(sender, instance, **kwargs):
+    """Пересчитать поисковый документ рецепта."""
+    search.schedule_update([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_search_document_ingredients(sender, instance, **kwargs):
+    """Пересчитать документ рецепта при смене его ингредиентов."""
+    search.schedule_update([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_search_documents_ingredient(sender, instance, created, **kwargs):
+    """Пересчитать документы рецептов с переименованным ингредиентом."""
+    if not created:
+        search.schedule_update(
+            instance.recipe_ingredients.values_list("recipe_id", flat=True)
+        )
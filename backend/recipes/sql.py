@@ -0,0 +1,212 @@
+import io
+import sqlite3
+from itertools import islice
+
+from django.db import connection
+
+from users.models import Follow, User
+
+from .models import Recipe, TimelineEntry
+
+
+def supports_returning():
+    """RETURNING в INSERT и DELETE есть в PostgreSQL и SQLite с 3.35."""
+    if connection.vendor == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return connection.vendor == "postgresql"
+
+
+def columns(model, *field_names):
+    """Экранированные имена таблицы и столбцов полей модели."""
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table),
+        *(
+            quote(model._meta.get_field(name).column)
+            for name in field_names
+        ),
+    )
+
+
+def insert_ignore(model, owner_field, owner_id, key_field, keys):
+    """Вставить пары (owner_id, key), пропуская уже существующие.
+
+    Один INSERT ... ON CONFLICT DO NOTHING RETURNING: конкурентная
+    вставка той же пары не падает с IntegrityError на уникальном
+    ограничении, а просто не попадает в результат. Возвращает словарь
+    {key: pk} действительно вставленных строк.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    table, owner, key, pk = columns(
+        model, owner_field, key_field, model._meta.pk.name
+    )
+    with connection.cursor() as cursor:
+        if not supports_returning():
+            inserted = {}
+            for value in keys:
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO {table} ({owner}, {key}) "
+                    f"VALUES (%s, %s)",
+                    [owner_id, value],
+                )
+                if cursor.rowcount:
+                    inserted[value] = cursor.lastrowid
+            return inserted
+        cursor.execute(
+            f"INSERT INTO {table} ({owner}, {key}) VALUES "
+            + ", ".join(["(%s, %s)"] * len(keys))
+            + f" ON CONFLICT ({owner}, {key}) DO NOTHING "
+            f"RETURNING {key}, {pk}",
+            [param for value in keys for param in (owner_id, value)],
+        )
+        return dict(cursor.fetchall())
+
+
+def delete_returning(model, owner_field, owner_id, key_field, keys):
+    """Удалить пары (owner_id, key) одним DELETE ... RETURNING.
+
+    Возвращает множество ключей действительно удаленных строк.
+    """
+    keys = list(keys)
+    if not keys:
+        return set()
+    table, owner, key = columns(model, owner_field, key_field)
+    with connection.cursor() as cursor:
+        if not supports_returning():
+            deleted = set()
+            for value in keys:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {owner} = %s "
+                    f"AND {key} = %s",
+                    [owner_id, value],
+                )
+                if cursor.rowcount:
+                    deleted.add(value)
+            return deleted
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {owner} = %s AND {key} IN ("
+            + ", ".join(["%s"] * len(keys))
+            + f") RETURNING {key}",
+            [owner_id, *keys],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def latest_recipes(author_ids, limit=None):
+    """Последние limit рецептов каждого автора одним запросом.
+
+    ROW_NUMBER() нумерует рецепты внутри автора в порядке Meta.ordering,
+    внешний запрос отсекает лишние. Возвращает словарь
+    {author_id: [рецепты]}.
+    """
+    author_ids = list(author_ids)
+    if not author_ids or limit == 0:
+        return {}
+    table, author, pub_date, pk = columns(
+        Recipe, "author", "pub_date", "id"
+    )
+    params = list(author_ids)
+    limit_condition = ""
+    if limit is not None:
+        limit_condition = "WHERE ranked.recipe_rank <= %s"
+        params.append(limit)
+    recipes = Recipe.objects.raw(
+        f"SELECT * FROM (SELECT {table}.*, ROW_NUMBER() OVER ("
+        f"PARTITION BY {author} ORDER BY {pub_date} DESC, {pk} DESC"
+        f") AS recipe_rank FROM {table} WHERE {author} IN ("
+        + ", ".join(["%s"] * len(author_ids))
+        + f")) ranked {limit_condition} "
+        f"ORDER BY ranked.{author}, ranked.recipe_rank",
+        params,
+    )
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe.author_id, []).append(recipe)
+    return by_author
+
+
+def fill_timelines(limit, max_followers):
+    """Заполнить ленты последними limit рецептами каждого автора одним
+    INSERT ... SELECT.
+
+    ROW_NUMBER() отбирает рецепты автора, как latest_recipes, а
+    соединение с подписками размножает их по лентам подписчиков. Авторы
+    с числом подписчиков больше max_followers пропускаются. Возвращает
+    количество записей.
+    """
+    timeline, user, recipe, author, pub_date = columns(
+        TimelineEntry, "user", "recipe", "author", "pub_date"
+    )
+    recipes, recipe_id, recipe_author, recipe_pub_date = columns(
+        Recipe, "id", "author", "pub_date"
+    )
+    follows, follower, followed = columns(Follow, "user", "author")
+    users, user_id, followers_count = columns(User, "id", "followers_count")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {timeline} ({user}, {recipe}, {author}, "
+            f"{pub_date}) "
+            f"SELECT {follows}.{follower}, ranked.{recipe_id}, "
+            f"ranked.{recipe_author}, ranked.{recipe_pub_date} "
+            f"FROM (SELECT {recipe_id}, {recipe_author}, "
+            f"{recipe_pub_date}, ROW_NUMBER() OVER (PARTITION BY "
+            f"{recipe_author} ORDER BY {recipe_pub_date} DESC, "
+            f"{recipe_id} DESC) AS recipe_rank FROM {recipes}) ranked "
+            f"INNER JOIN {users} "
+            f"ON {users}.{user_id} = ranked.{recipe_author} "
+            f"INNER JOIN {follows} "
+            f"ON {follows}.{followed} = ranked.{recipe_author} "
+            f"WHERE ranked.recipe_rank <= %s "
+            f"AND {users}.{followers_count} <= %s",
+            [limit, max_followers],
+        )
+        return cursor.rowcount
+
+
+def csv_field(value):
+    """Поле CSV для COPY: None — пустое поле без кавычек, то есть NULL,
+    остальное в кавычках, так что пустая строка остается строкой."""
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class CSVStream(io.RawIOBase):
+    """Файлоподобный поток CSV из строк-кортежей для COPY FROM STDIN."""
+
+    rows_per_read = 1000
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while len(self.buffer) < len(target):
+            data = "".join(
+                ",".join(map(csv_field, row)) + "\n"
+                for row in islice(self.rows, self.rows_per_read)
+            ).encode("utf-8")
+            if not data:
+                break
+            self.buffer += data
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def copy_from(table, column_names, rows):
+    """Загрузить строки в таблицу через COPY FROM STDIN (PostgreSQL)."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote(table)} "
+            f"({', '.join(quote(name) for name in column_names)}) "
+            f"FROM STDIN WITH (FORMAT csv)",
+            CSVStream(rows),
+        )
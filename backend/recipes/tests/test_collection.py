@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from recipes.collection import add_recipes, remove_recipes
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import User
+
+# Параллельных потоков и вызовов одного переключателя
+THREADS = 8
+CALLS = 40
+
+
+def hammer(function, *args):
+    """Вызвать function(*args) CALLS раз из пула потоков."""
+
+    def call(_):
+        try:
+            return function(*args)
+        finally:
+            # У каждого потока свое соединение с базой
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return list(executor.map(call, range(CALLS)))
+
+
+class CollectionConcurrencyTest(TransactionTestCase):
+    """Конкурентное добавление и удаление рецепта из избранного и
+    корзины: одна строка, верные счетчики, один успешный вызов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="user",
+            email="user@example.com",
+            password="password",
+            first_name="Имя",
+            last_name="Фамилия",
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name="Рецепт",
+            image="recipes/images/recipe.png",
+            text="Текст",
+            cooking_time=10,
+        )
+        self.ingredient = Ingredient.objects.create(
+            name="Соль", measurement_unit="г"
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=5
+        )
+
+    def toggle(self, model, counter):
+        args = (model, self.user.pk, [self.recipe.pk])
+        added = hammer(add_recipes, *args)
+        self.assertEqual(sum(1 for result in added if result), 1)
+        self.assertEqual(
+            model.objects.filter(user=self.user, recipe=self.recipe).count(),
+            1,
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, counter), 1)
+
+        removed = hammer(remove_recipes, *args)
+        self.assertEqual(sum(1 for result in removed if result), 1)
+        self.assertFalse(
+            model.objects.filter(user=self.user, recipe=self.recipe).exists()
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, counter), 0)
+
+    def test_favorite(self):
+        self.toggle(Favorite, "favorites_count")
+
+    def test_shopping_cart(self):
+        self.toggle(ShoppingCart, "shopping_cart_count")
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.user).exists()
+        )
@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from recipes.counters import change_counter
+from recipes.models import Recipe
+from users.models import User
+
+
+class CounterFieldsTest(TestCase):
+    """Полное сохранение устаревшего объекта не откатывает счетчики."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="user",
+            email="user@example.com",
+            password="password",
+            first_name="Имя",
+            last_name="Фамилия",
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name="Рецепт",
+            image="recipes/images/recipe.png",
+            text="Текст",
+            cooking_time=10,
+        )
+
+    def test_recipe_save_keeps_counters(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        change_counter(
+            Recipe.objects.filter(pk=self.recipe.pk), "favorites_count", 1
+        )
+        stale.cooking_time = 20
+        stale.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cooking_time, 20)
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_user_save_keeps_counters(self):
+        stale = User.objects.get(pk=self.user.pk)
+        change_counter(
+            User.objects.filter(pk=self.user.pk), "followers_count", 1
+        )
+        stale.first_name = "Другое"
+        stale.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Другое")
+        self.assertEqual(self.user.followers_count, 1)
+        self.assertEqual(self.user.recipes_count, 1)
+
+    def test_user_save_keeps_shopping_list_version(self):
+        stale = User.objects.get(pk=self.user.pk)
+        change_counter(
+            User.objects.filter(pk=self.user.pk), "shopping_list_version", 1
+        )
+        stale.avatar = "users/avatars/avatar.png"
+        stale.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shopping_list_version, 1)
@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestCase, create_recipe, create_user
+from recipes import timeline
+from recipes.counters import recount
+from recipes.models import TimelineEntry
+from users.models import Follow, User
+
+
+class TimelineRebuildTest(TestCase):
+    """Пересборка лент: последние рецепты авторов с ограничением."""
+
+    def setUp(self):
+        self.user = create_user("user")
+        self.author = create_user("author")
+        self.recipes = [
+            create_recipe(self.author, name=f"Рецепт {number}")
+            for number in range(3)
+        ]
+        Follow.objects.create(user=self.user, author=self.author)
+        recount(
+            User.objects.all(),
+            "followers_count",
+            Follow.objects.all(),
+            "author",
+        )
+
+    def entries(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.user).values_list(
+                "recipe_id", flat=True
+            )
+        )
+
+    @mock.patch("recipes.timeline.TIMELINE_BACKFILL_LIMIT", 2)
+    def test_rebuild_keeps_latest_recipes_of_author(self):
+        self.assertEqual(timeline.rebuild(), 2)
+        self.assertEqual(
+            self.entries(), [recipe.pk for recipe in self.recipes[:0:-1]]
+        )
+
+    @mock.patch("recipes.timeline.TIMELINE_FANOUT_MAX_FOLLOWERS", 0)
+    def test_rebuild_skips_popular_authors(self):
+        self.assertEqual(timeline.rebuild(), 0)
+        self.assertEqual(self.entries(), [])
+
+
+class TimelineFollowTest(APITestCase):
+    """Лента после подписки и отписки через API."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.author = create_user("author")
+        self.other = create_user("other")
+        self.recipes = [
+            create_recipe(self.author, name=f"Рецепт {number}")
+            for number in range(3)
+        ]
+        self.other_recipe = create_recipe(self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def follow(self, author, method="post"):
+        response = getattr(self.client, method)(
+            f"/api/users/{author.pk}/subscribe/"
+        )
+        self.assertIn(response.status_code, (201, 204))
+
+    def feed(self):
+        response = self.client.get("/api/recipes/feed/")
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def entries(self, author):
+        return TimelineEntry.objects.filter(user=self.user, author=author)
+
+    @mock.patch("recipes.timeline.TIMELINE_BACKFILL_LIMIT", 2)
+    def test_follow_backfills_latest_recipes(self):
+        self.follow(self.author)
+        self.assertEqual(
+            self.feed(), [recipe.pk for recipe in self.recipes[:0:-1]]
+        )
+        self.assertEqual(self.entries(self.author).count(), 2)
+
+    def test_new_recipe_is_fanned_out(self):
+        self.follow(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.author, name="Новый")
+        self.assertEqual(self.feed()[0], recipe.pk)
+        self.assertTrue(self.entries(self.author).filter(recipe=recipe))
+
+    def test_unfollow_purges_only_that_author(self):
+        self.follow(self.author)
+        self.follow(self.other)
+        self.follow(self.author, "delete")
+        self.assertFalse(self.entries(self.author).exists())
+        self.assertEqual(self.feed(), [self.other_recipe.pk])
+
+    @mock.patch("recipes.timeline.TIMELINE_FANOUT_MAX_FOLLOWERS", 0)
+    def test_popular_author_is_read_on_the_fly(self):
+        self.follow(self.author)
+        self.assertFalse(self.entries(self.author).exists())
+        self.assertEqual(
+            self.feed(), [recipe.pk for recipe in reversed(self.recipes)]
+        )
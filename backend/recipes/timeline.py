@@ -0,0 +1,131 @@
+import heapq
+from itertools import islice
+
+from django.db.models import Exists, OuterRef, Q
+
+from users.models import Follow, User
+
+from .constants import (
+    TIMELINE_BACKFILL_LIMIT, TIMELINE_BATCH_SIZE,
+    TIMELINE_FANOUT_MAX_FOLLOWERS,
+)
+from .models import Recipe, TimelineEntry
+from .sql import fill_timelines, latest_recipes
+
+
+def insert_entries(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=TIMELINE_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(recipe):
+    """Разослать рецепт по лентам подписчиков автора пачками."""
+    followers_count = User.objects.values_list(
+        "followers_count", flat=True
+    ).get(pk=recipe.author_id)
+    if followers_count > TIMELINE_FANOUT_MAX_FOLLOWERS:
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=recipe.author_id)
+        .order_by()
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=TIMELINE_BATCH_SIZE)
+    )
+    while True:
+        batch = list(islice(follower_ids, TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        insert_entries(
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe.pk,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date,
+            )
+            for user_id in batch
+        )
+
+
+def backfill(user_id, author_ids):
+    """Добавить в ленту последние рецепты авторов после подписки."""
+    author_ids = User.objects.filter(
+        pk__in=author_ids,
+        followers_count__lte=TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).values_list("pk", flat=True)
+    insert_entries(
+        TimelineEntry(
+            user_id=user_id,
+            recipe_id=recipe.pk,
+            author_id=recipe.author_id,
+            pub_date=recipe.pub_date,
+        )
+        for recipes in latest_recipes(
+            author_ids, TIMELINE_BACKFILL_LIMIT
+        ).values()
+        for recipe in recipes
+    )
+
+
+def purge(user_id, author_ids):
+    """Убрать из ленты рецепты авторов после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def rebuild():
+    """Пересобрать все ленты по текущим подпискам.
+
+    Как и при подписке, в ленту попадают последние
+    TIMELINE_BACKFILL_LIMIT рецептов каждого автора. Возвращает
+    количество записей.
+    """
+    TimelineEntry.objects.all().delete()
+    return fill_timelines(
+        TIMELINE_BACKFILL_LIMIT, TIMELINE_FANOUT_MAX_FOLLOWERS
+    )
+
+
+def before_key(date_field, id_field, before):
+    """Условие keyset-пагинации: ключ меньше before."""
+    if before is None:
+        return Q()
+    pub_date, pk = before
+    return Q(**{f"{date_field}__lt": pub_date}) | Q(
+        **{date_field: pub_date, f"{id_field}__lt": pk}
+    )
+
+
+def feed(user_id, before, size):
+    """Ключи (pub_date, recipe_id) страницы ленты по убыванию.
+
+    Записи берутся из таблицы ленты по индексу (user, -pub_date,
+    -recipe). Рецепты авторов, которые не рассылаются по лентам,
+    выбираются по индексу (author, -pub_date, -id) и сливаются с
+    записями ленты. Рецепты, которые попали в ленту до того, как автор
+    перешел порог подписчиков, из второй выборки исключаются.
+    """
+    entries = (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .filter(before_key("pub_date", "recipe_id", before))
+        .order_by("-pub_date", "-recipe_id")
+        .values_list("pub_date", "recipe_id")[:size]
+    )
+    fan_in = (
+        Recipe.objects.filter(
+            author__following__user_id=user_id,
+            author__followers_count__gt=TIMELINE_FANOUT_MAX_FOLLOWERS,
+        )
+        .filter(before_key("pub_date", "id", before))
+        .filter(
+            ~Exists(
+                TimelineEntry.objects.filter(
+                    user_id=user_id, recipe=OuterRef("pk")
+                )
+            )
+        )
+        .order_by("-pub_date", "-id")
+        .values_list("pub_date", "id")[:size]
+    )
+    return list(islice(heapq.merge(entries, fan_in, reverse=True), size))
@@ -7,7 +7,15 @@ from .models import Follow, User
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
 
-    list_display = ("username", "email", "first_name", "last_name", "is_staff")
+    list_display = (
+        "username",
+        "email",
+        "first_name",
+        "last_name",
+        "recipes_count",
+        "followers_count",
+        "is_staff",
+    )
     search_fields = ("username", "email")
     search_help_text = "Поиск по имени пользователя или email"
     list_filter = ("is_staff", "is_superuser", "is_active", "date_joined")
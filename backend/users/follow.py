@@ -0,0 +1,52 @@
+from django.db import transaction
+
+from recipes import timeline
+from recipes.counters import change_counter
+from recipes.sql import delete_returning, insert_ignore
+
+from .models import Follow, User
+
+
+def follows_changed(user_id, author_ids, delta):
+    """Изменить счетчики подписок и ленту пользователя."""
+    if not author_ids:
+        return
+    change_counter(
+        User.objects.filter(pk__in=author_ids), "followers_count", delta
+    )
+    change_counter(
+        User.objects.filter(pk=user_id),
+        "following_count",
+        delta * len(author_ids),
+    )
+    if delta > 0:
+        timeline.backfill(user_id, author_ids)
+    else:
+        timeline.purge(user_id, author_ids)
+
+
+def subscribe(user_id, author_id):
+    """Подписать пользователя на автора одним INSERT ... ON CONFLICT.
+
+    Возвращает id подписки или None, если она уже была.
+    """
+    with transaction.atomic():
+        follow_id = insert_ignore(
+            Follow, "user", user_id, "author", [author_id]
+        ).get(author_id)
+        if follow_id is not None:
+            follows_changed(user_id, [author_id], 1)
+    return follow_id
+
+
+def unsubscribe(user_id, author_id):
+    """Отписать пользователя от автора одним DELETE ... RETURNING.
+
+    Возвращает False, если подписки не было.
+    """
+    with transaction.atomic():
+        removed = delete_returning(
+            Follow, "user", user_id, "author", [author_id]
+        )
+        follows_changed(user_id, removed, -1)
+    return bool(removed)
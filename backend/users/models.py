@@ -1,12 +1,21 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from recipes.counters import CounterFieldsMixin
+
 from .constants import EMAIL_MAX_LENGTH, NAME_MAX_LENGTH
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     """Кастомная модель пользователя."""
 
+    counter_fields = (
+        "recipes_count",
+        "followers_count",
+        "following_count",
+        "shopping_list_version",
+    )
+
     email = models.EmailField(
         "Адрес электронной почты",
         max_length=EMAIL_MAX_LENGTH,
@@ -26,6 +35,18 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        "Рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        "Подписчиков", default=0, editable=False
+    )
+    following_count = models.PositiveIntegerField(
+        "Подписок", default=0, editable=False
+    )
+    shopping_list_version = models.PositiveIntegerField(
+        "Версия списка покупок", default=0, editable=False
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
@@ -42,11 +63,13 @@ class User(AbstractUser):
 class Follow(models.Model):
     """Модель подписки на авторов."""
 
+    # Поиск по подписчику покрывает follow_user_id_idx
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="follower",
         verbose_name="Подписчик",
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -58,6 +81,10 @@ class Follow(models.Model):
     class Meta:
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["user", "-id"], name="follow_user_id_idx")
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "author"], name="unique_follow"
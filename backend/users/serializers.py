@@ -4,6 +4,7 @@ from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import Recipe
+from recipes.sql import latest_recipes
 
 from .constants import EMAIL_MAX_LENGTH, NAME_MAX_LENGTH, USERNAME_MAX_LENGTH
 from .models import Follow, User
@@ -107,6 +108,9 @@ class CustomUserSerializer(UserSerializer):
         if not user or user.is_anonymous:
             return False
 
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
         return self.is_user_subscribed_to_author(user, obj)
 
     def is_user_subscribed_to_author(self, user, author):
@@ -132,6 +136,15 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "image", "cooking_time")
 
 
+def get_recipes_limit(request):
+    """Значение ?recipes_limit или None, если оно не задано или неверно."""
+    try:
+        limit = int(request.query_params.get("recipes_limit"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор для подписок."""
 
@@ -169,16 +182,20 @@ class FollowSerializer(serializers.ModelSerializer):
         return True
 
     def get_recipes(self, obj):
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        recipes = Recipe.objects.filter(author=obj.author)
-        if limit:
-            try:
-                limit = int(limit)
-                recipes = recipes[:limit]
-            except (ValueError, TypeError):
-                pass
-        return RecipeShortSerializer(recipes, many=True).data
+        """Рецепты автора с учетом ?recipes_limit.
+
+        Список подписок передает в context["author_recipes"] рецепты всех
+        авторов страницы, выбранные одним запросом.
+        """
+        author_recipes = self.context.get("author_recipes")
+        if author_recipes is None:
+            author_recipes = latest_recipes(
+                [obj.author_id],
+                get_recipes_limit(self.context.get("request")),
+            )
+        return RecipeShortSerializer(
+            author_recipes.get(obj.author_id, []), many=True
+        ).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
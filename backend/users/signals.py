@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .follow import follows_changed
+from .models import Follow
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counters(sender, instance, created, raw, **kwargs):
+    """Увеличить счетчики подписчиков автора и подписок пользователя."""
+    if created and not raw:
+        follows_changed(instance.user_id, [instance.author_id], 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counters(sender, instance, **kwargs):
+    """Уменьшить счетчики подписчиков автора и подписок пользователя."""
+    follows_changed(instance.user_id, [instance.author_id], -1)
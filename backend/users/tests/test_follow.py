@@ -0,0 +1,47 @@
+from django.test import TransactionTestCase
+
+from recipes.tests.test_collection import hammer
+from users.follow import subscribe, unsubscribe
+from users.models import Follow, User
+
+
+class FollowConcurrencyTest(TransactionTestCase):
+    """Конкурентная подписка и отписка: одна строка, верные счетчики,
+    один успешный вызов."""
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="password",
+            first_name="Имя",
+            last_name="Фамилия",
+        )
+
+    def assert_counters(self, count):
+        self.user.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.user.following_count, count)
+        self.assertEqual(self.author.followers_count, count)
+
+    def setUp(self):
+        self.user = self.create_user("user")
+        self.author = self.create_user("author")
+
+    def test_subscribe_unsubscribe(self):
+        created = hammer(subscribe, self.user.pk, self.author.pk)
+        self.assertEqual(
+            sum(1 for result in created if result is not None), 1
+        )
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author).count(),
+            1,
+        )
+        self.assert_counters(1)
+
+        deleted = hammer(unsubscribe, self.user.pk, self.author.pk)
+        self.assertEqual(sum(1 for result in deleted if result), 1)
+        self.assertFalse(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.assert_counters(0)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.tests.base import APITestCase, create_recipe, create_user
+from recipes.models import Recipe
+from users.models import Follow
+
+# Запросов к БД на страницу подписок при любом числе авторов
+SUBSCRIPTIONS_QUERIES = 3
+
+
+class SubscriptionRecipesTest(APITestCase):
+    """Рецепты авторов в подписках выбираются одним оконным запросом."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        for number in range(4):
+            author = create_user(f"author{number}")
+            Follow.objects.create(user=self.user, author=author)
+            for age in range(number + 1):
+                recipe = create_recipe(author, name=f"Рецепт {number}.{age}")
+                # Порядок публикации обратен порядку id
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    pub_date=now - timedelta(days=age)
+                )
+
+    def subscriptions(self, **params):
+        response = self.client.get("/api/users/subscriptions/", params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            author["id"]: [recipe["id"] for recipe in author["recipes"]]
+            for author in response.data["results"]
+        }
+
+    def latest(self, author_id, limit=None):
+        return list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by("-pub_date", "-id")
+            .values_list("id", flat=True)[:limit]
+        )
+
+    def test_recipes_limit(self):
+        for limit in (1, 2):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    self.subscriptions(recipes_limit=limit),
+                    {
+                        author_id: self.latest(author_id, limit)
+                        for author_id in self.subscriptions()
+                    },
+                )
+
+    def test_without_limit(self):
+        recipes = self.subscriptions()
+        self.assertEqual(len(recipes), 4)
+        for author_id, recipe_ids in recipes.items():
+            self.assertEqual(recipe_ids, self.latest(author_id))
+
+    def test_zero_limit(self):
+        self.assertEqual(
+            set(map(tuple, self.subscriptions(recipes_limit=0).values())),
+            {()},
+        )
+
+    def test_queries_do_not_depend_on_page_size(self):
+        for limit in (1, 4):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(SUBSCRIPTIONS_QUERIES):
+                    self.subscriptions(limit=limit, recipes_limit=2)
@@ -8,12 +8,15 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 
-from api.pagination import LimitPageNumberPagination
+from api.pagination import LimitPageNumberPagination, SubscriptionPagination
+from api.signals import touch_on_commit
+from recipes.sql import latest_recipes
 
+from .follow import subscribe, unsubscribe
 from .models import Follow, User
 from .serializers import (
     AvatarSerializer, CustomUserCreateSerializer, CustomUserSerializer,
-    FollowSerializer,
+    FollowSerializer, get_recipes_limit,
 )
 
 
@@ -41,15 +44,24 @@ class CustomUserViewSet(UserViewSet):
         return [permission() for permission in self.permission_classes]
 
     @action(
-        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        pagination_class=SubscriptionPagination,
     )
     def subscriptions(self, request):
         """Получить список подписок пользователя."""
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related("author")
         pages = self.paginate_queryset(queryset)
+        author_recipes = latest_recipes(
+            (follow.author_id for follow in pages),
+            get_recipes_limit(request),
+        )
         serializer = FollowSerializer(
-            pages, many=True, context={"request": request}
+            pages,
+            many=True,
+            context={"request": request, "author_recipes": author_recipes},
         )
         return self.get_paginated_response(serializer.data)
 
@@ -76,31 +88,28 @@ class CustomUserViewSet(UserViewSet):
                 {"errors": "Нельзя подписаться на самого себя"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if self.is_user_subscribed_to_author(user, author):
+        follow_id = subscribe(user.pk, author.pk)
+        if follow_id is None:
             return Response(
                 {"errors": "Вы уже подписаны на этого пользователя"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        touch_on_commit(f"user:{user.pk}")
 
-        follow = Follow.objects.create(user=user, author=author)
+        follow = Follow(pk=follow_id, user=user, author=author)
         serializer = FollowSerializer(follow, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def handle_unsubscribe(self, user, author):
         """Обработать отписку от автора."""
-        follow = Follow.objects.filter(user=user, author=author)
-        if follow.exists():
-            follow.delete()
+        if unsubscribe(user.pk, author.pk):
+            touch_on_commit(f"user:{user.pk}")
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Вы не подписаны на этого пользователя"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    def is_user_subscribed_to_author(self, user, author):
-        """Проверить подписку пользователя на автора."""
-        return Follow.objects.filter(user=user, author=author).exists()
-
     @action(
         detail=False,
         methods=["put", "delete"],
@@ -136,6 +145,6 @@ class CustomUserViewSet(UserViewSet):
 
     def handle_avatar_delete(self, user):
         """Обработать удаление аватара."""
-        user.avatar.delete()
-        user.save()
+        user.avatar.delete(save=False)
+        user.save(update_fields=["avatar"])
         return Response(status=status.HTTP_204_NO_CONTENT)
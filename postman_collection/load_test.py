@@ -0,0 +1,629 @@
+"""Нагрузочный прогон postman-коллекции.
+
+Скрипт разбирает foodgram.postman_collection.json: переменные коллекции,
+авторизацию папок и запросов, сохранение id и токенов из тестовых
+скриптов. Затем он повторяет сценарий коллекции параллельно из asyncio
+и печатает по каждому запросу пропускную способность, перцентили и
+гистограмму задержек и долю ошибок. Ошибкой считается ответ с кодом,
+отличным от ожидаемого тестом коллекции, или сбой соединения.
+
+Нужна только стандартная библиотека, так что скрипт работает без сети
+против runserver или gunicorn с SQLite:
+
+    python load_test.py --users 10 --duration 60
+    python load_test.py --rate 5 --users 50 --duration 60 --output run.json
+
+Каждый проход сценария регистрирует своих пользователей: к username и
+email из переменных коллекции добавляется уникальный суффикс.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import socket
+import ssl
+import sys
+import time
+import uuid
+from collections import Counter
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+DEFAULT_COLLECTION = "foodgram.postman_collection.json"
+
+# Переменные, которые делаются уникальными для каждого прохода сценария
+UNIQUE_VARIABLES = (
+    "username",
+    "email",
+    "secondUserUsername",
+    "secondUserEmail",
+    "thirdUserUsername",
+    "thirdUserEmail",
+)
+
+# Границы корзин гистограммы задержек, мс
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Ширина полосы гистограммы в отчете
+HISTOGRAM_WIDTH = 40
+
+VARIABLE_RE = re.compile(r"\{\{(\w+)\}\}")
+EXPECTED_STATUS_RE = re.compile(
+    r"pm\.response\.status,.*?\)\.to\.be\.eql\(\s*[\"']([^\"']+)[\"']\s*\)",
+    re.S,
+)
+LOCAL_RE = re.compile(
+    r"const (\w+) = _\.get\(\s*responseData,\s*[\"']([^\"']+)[\"']\s*\)"
+)
+SET_RE = re.compile(
+    r"pm\.collectionVariables\.set\(\s*[\"'](\w+)[\"'],\s*(.+?)\)\s*;?\s*$",
+    re.M,
+)
+EXPRESSION_RE = re.compile(
+    r"^responseData((?:\[\d+\]|\.\w+)*?)"
+    r"(?:\.slice\(\s*(\d+)\s*,\s*(\d+)\s*\))?$"
+)
+ACCESSOR_RE = re.compile(r"\[(\d+)\]|\.(\w+)")
+STATUS_BY_PHRASE = {status.phrase: status.value for status in HTTPStatus}
+
+
+class Step:
+    """Запрос коллекции, готовый к подстановке переменных."""
+
+    def __init__(self, name, request, auth, script):
+        self.name = name
+        self.method = request["method"]
+        url = request["url"]
+        self.url = url["raw"] if isinstance(url, dict) else url
+        self.headers = [
+            (header["key"], header["value"])
+            for header in request.get("header", [])
+            if not header.get("disabled")
+        ]
+        body = request.get("body") or {}
+        self.body = body.get("raw", "") if body.get("mode") == "raw" else ""
+        language = body.get("options", {}).get("raw", {}).get("language")
+        if self.body and language == "json" and not any(
+            key.lower() == "content-type" for key, _ in self.headers
+        ):
+            self.headers.append(("Content-Type", "application/json"))
+        self.auth = auth
+        expected = EXPECTED_STATUS_RE.search(script)
+        self.expected = (
+            STATUS_BY_PHRASE.get(expected.group(1)) if expected else None
+        )
+        self.extract = parse_extractions(script)
+
+
+def parse_extractions(script):
+    """Пары (переменная, путь, срез) из collectionVariables.set()."""
+    locals_ = dict(LOCAL_RE.findall(script))
+    extractions = []
+    for name, expression in SET_RE.findall(script):
+        expression = expression.strip()
+        if expression in locals_:
+            path = [
+                int(part) if part.isdigit() else part
+                for part in locals_[expression].split(".")
+            ]
+            extractions.append((name, path, None))
+            continue
+        match = EXPRESSION_RE.match(expression)
+        if match is None:
+            continue
+        path = [
+            int(index) if index else attribute
+            for index, attribute in ACCESSOR_RE.findall(match.group(1))
+        ]
+        piece = (
+            slice(int(match.group(2)), int(match.group(3)))
+            if match.group(2)
+            else None
+        )
+        extractions.append((name, path, piece))
+    return extractions
+
+
+def parse_auth(auth, inherited):
+    """Заголовок авторизации (имя, шаблон значения) или None.
+
+    Как в Postman: без auth запрос наследует авторизацию папки,
+    noauth ее отключает. Поддерживаются apikey и bearer.
+    """
+    if auth is None:
+        return inherited
+    if auth["type"] == "apikey":
+        options = {item["key"]: item["value"] for item in auth["apikey"]}
+        return options.get("key", "Authorization"), options.get("value", "")
+    if auth["type"] == "bearer":
+        options = {item["key"]: item["value"] for item in auth["bearer"]}
+        return "Authorization", f"Bearer {options.get('token', '')}"
+    return None
+
+
+def flatten(items, auth=None, path=(), exclude=()):
+    """Запросы коллекции по порядку с унаследованной авторизацией."""
+    for item in items:
+        item_path = (*path, item["name"].strip())
+        if any(pattern in " / ".join(item_path) for pattern in exclude):
+            continue
+        if "item" in item:
+            yield from flatten(
+                item["item"],
+                parse_auth(item.get("auth"), auth),
+                item_path,
+                exclude,
+            )
+            continue
+        script = "\n".join(
+            line
+            for event in item.get("event", [])
+            if event["listen"] == "test"
+            for line in event["script"]["exec"]
+        )
+        request = item["request"]
+        yield Step(
+            f"{item_path[0]} / {item_path[-1]}",
+            request,
+            parse_auth(request.get("auth"), auth),
+            script,
+        )
+
+
+def load_collection(path, exclude):
+    with open(path, encoding="utf-8") as file:
+        collection = json.load(file)
+    variables = {
+        variable["key"]: variable.get("value", "")
+        for variable in collection.get("variable", [])
+    }
+    steps = list(
+        flatten(
+            collection["item"],
+            parse_auth(collection.get("auth"), None),
+            exclude=exclude,
+        )
+    )
+    return variables, steps
+
+
+def make_unique(value, tag):
+    """Добавить суффикс к логину или к локальной части email."""
+    quoted = value.startswith('"') and value.endswith('"')
+    if quoted:
+        value = value[1:-1]
+    local, at, domain = value.partition("@")
+    value = f"{local}.{tag}{at}{domain}"
+    return f'"{value}"' if quoted else value
+
+
+def substitute(text, variables):
+    return VARIABLE_RE.sub(
+        lambda match: str(variables.get(match.group(1), match.group(0))),
+        text,
+    )
+
+
+def extract(data, path, piece):
+    for key in path:
+        data = data[key]
+    return data[piece] if piece is not None else data
+
+
+class Client:
+    """HTTP/1.1 клиент с одним keep-alive соединением."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, target, headers, body):
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(
+                        self.host,
+                        self.port,
+                        ssl=self.https and ssl.create_default_context(),
+                    ),
+                    self.timeout,
+                )
+            try:
+                return await asyncio.wait_for(
+                    self.exchange(method, target, headers, body),
+                    self.timeout,
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                # Сервер мог закрыть простаивающее соединение
+                if not reused or attempt == 2:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+    async def exchange(self, method, target, headers, body):
+        lines = [
+            f"{method} {self.prefix}{target} HTTP/1.1",
+            f"Host: {self.host_header}",
+            f"Content-Length: {len(body)}",
+            *(f"{key}: {value}" for key, value in headers),
+        ]
+        self.writer.write(
+            ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + body
+        )
+        await self.writer.drain()
+        if hasattr(socket, "TCP_QUICKACK"):
+            # Linux: без немедленного ACK ответ keep-alive соединения
+            # ждет отложенного подтверждения, и к задержке добавляется
+            # 40 мс
+            self.writer.get_extra_info("socket").setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1
+            )
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Соединение закрыто сервером")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+        close = response_headers.get("connection", "").lower() == "close"
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            content = b""
+        elif "chunked" in response_headers.get("transfer-encoding", ""):
+            content = await self.read_chunked()
+        elif "content-length" in response_headers:
+            content = await self.reader.readexactly(
+                int(response_headers["content-length"])
+            )
+        else:
+            content = await self.reader.read()
+            close = True
+        if close:
+            await self.close()
+        return status, content
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await self.reader.readline()) not in (b"\r\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+class Stats:
+    """Задержки, коды ответов и ошибки по именам запросов."""
+
+    def __init__(self):
+        self.names = []
+        self.latencies = {}
+        self.errors = Counter()
+        self.statuses = {}
+        self.flows = Counter()
+
+    def record(self, name, latency_ms, status, ok):
+        if name not in self.latencies:
+            self.names.append(name)
+            self.latencies[name] = []
+            self.statuses[name] = Counter()
+        self.latencies[name].append(latency_ms)
+        self.statuses[name][status or "error"] += 1
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, elapsed):
+        return {
+            name: summarize(
+                self.latencies[name],
+                self.errors[name],
+                self.statuses[name],
+                elapsed,
+            )
+            for name in self.names
+        }
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, round(fraction * len(ordered)) - 1)]
+
+
+def summarize(latencies, errors, statuses, elapsed):
+    ordered = sorted(latencies)
+    histogram = Counter(
+        next(
+            (bound for bound in HISTOGRAM_BUCKETS_MS if latency <= bound),
+            None,
+        )
+        for latency in ordered
+    )
+    return {
+        "count": len(ordered),
+        "rps": round(len(ordered) / elapsed, 2),
+        "errors": errors,
+        "error_rate": round(errors / len(ordered), 4),
+        "statuses": {str(key): value for key, value in statuses.items()},
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": round(percentile(ordered, 0.5), 2),
+        "p90_ms": round(percentile(ordered, 0.9), 2),
+        "p99_ms": round(percentile(ordered, 0.99), 2),
+        "max_ms": round(ordered[-1], 2),
+        "histogram": [
+            [bound, histogram.get(bound, 0)]
+            for bound in (*HISTOGRAM_BUCKETS_MS, None)
+        ],
+    }
+
+
+async def run_flow(steps, variables, client, stats, think_time):
+    """Пройти сценарий коллекции от начала до конца."""
+    try:
+        for step in steps:
+            url = urlsplit(substitute(step.url, variables))
+            target = url.path or "/"
+            if url.query:
+                target += f"?{url.query}"
+            headers = [
+                (key, substitute(value, variables))
+                for key, value in step.headers
+            ]
+            if step.auth is not None:
+                key, value = step.auth
+                headers.append((key, substitute(value, variables)))
+            body = substitute(step.body, variables).encode("utf-8")
+            started = time.perf_counter()
+            try:
+                status, content = await client.request(
+                    step.method, target, headers, body
+                )
+            except (OSError, asyncio.TimeoutError, ValueError):
+                stats.record(
+                    step.name, (time.perf_counter() - started) * 1000, None,
+                    False,
+                )
+                continue
+            stats.record(
+                step.name,
+                (time.perf_counter() - started) * 1000,
+                status,
+                status == step.expected
+                if step.expected is not None
+                else status < 400,
+            )
+            if step.extract and 200 <= status < 300:
+                try:
+                    data = json.loads(content)
+                except ValueError:
+                    data = None
+                for name, path, piece in step.extract:
+                    try:
+                        variables[name] = extract(data, path, piece)
+                    except (KeyError, IndexError, TypeError):
+                        pass
+            if think_time:
+                await asyncio.sleep(think_time)
+    finally:
+        await client.close()
+
+
+def flow_variables(base_variables, base_url, tag):
+    variables = dict(base_variables)
+    if base_url:
+        variables["baseUrl"] = base_url
+    for name in UNIQUE_VARIABLES:
+        if name in variables:
+            variables[name] = make_unique(variables[name], tag)
+    return variables
+
+
+async def closed_model(options, variables, steps, stats, run_id):
+    """Фиксированное число виртуальных пользователей по кругу."""
+    deadline = time.perf_counter() + options.duration
+
+    async def virtual_user(index):
+        await asyncio.sleep(options.ramp_up * index / options.users)
+        iteration = 0
+        while time.perf_counter() < deadline and (
+            not options.iterations or iteration < options.iterations
+        ):
+            flow = flow_variables(
+                variables, options.base_url, f"{run_id}-{index}-{iteration}"
+            )
+            await run_flow(
+                steps,
+                flow,
+                Client(flow["baseUrl"], options.timeout),
+                stats,
+                options.think_time,
+            )
+            stats.flows["completed"] += 1
+            iteration += 1
+
+    await asyncio.gather(*(virtual_user(i) for i in range(options.users)))
+
+
+async def open_model(options, variables, steps, stats, run_id):
+    """Новые проходы сценария с интенсивностью rate в секунду.
+
+    Интервалы между приходами экспоненциальные. Если уже идут users
+    проходов, новый отбрасывается и учитывается в dropped: ожидание
+    в очереди исказило бы задержки.
+    """
+    deadline = time.perf_counter() + options.duration
+    active = set()
+    index = 0
+
+    async def flow(index):
+        variables_ = flow_variables(
+            variables, options.base_url, f"{run_id}-{index}"
+        )
+        await run_flow(
+            steps,
+            variables_,
+            Client(variables_["baseUrl"], options.timeout),
+            stats,
+            options.think_time,
+        )
+        stats.flows["completed"] += 1
+
+    while time.perf_counter() < deadline:
+        if len(active) < options.users:
+            task = asyncio.ensure_future(flow(index))
+            active.add(task)
+            task.add_done_callback(active.discard)
+            index += 1
+        else:
+            stats.flows["dropped"] += 1
+        await asyncio.sleep(random.expovariate(options.rate))
+    if active:
+        await asyncio.gather(*active)
+
+
+def print_report(report, histograms, out=sys.stdout):
+    total = report["total"]
+    print(
+        f"Проходов сценария: {report['flows'].get('completed', 0)}, "
+        f"отброшено: {report['flows'].get('dropped', 0)}; "
+        f"запросов: {total['count']} за {report['elapsed_s']:.1f} с "
+        f"({total['rps']:.1f}/с), ошибок: {total['errors']} "
+        f"({total['error_rate']:.1%})",
+        file=out,
+    )
+    width = max(len(name) for name in report["requests"])
+    print(
+        f"{'запрос':<{width}} {'кол-во':>7} {'rps':>7} {'ошибки':>7} "
+        f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}",
+        file=out,
+    )
+    for name, result in report["requests"].items():
+        print(
+            f"{name:<{width}} {result['count']:>7} {result['rps']:>7.1f} "
+            f"{result['error_rate']:>7.1%} {result['p50_ms']:>8.1f} "
+            f"{result['p90_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+            f"{result['max_ms']:>8.1f}",
+            file=out,
+        )
+    if not histograms:
+        return
+    for name, result in report["requests"].items():
+        print(f"\n{name}", file=out)
+        peak = max(count for _, count in result["histogram"])
+        for bound, count in result["histogram"]:
+            label = f"<= {bound} мс" if bound else "больше"
+            bar = "#" * round(HISTOGRAM_WIDTH * count / peak) if peak else ""
+            print(f"  {label:>11} {count:>7} {bar}", file=out)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный прогон postman-коллекции foodgram"
+    )
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument(
+        "--base-url", help="Адрес сервера вместо переменной baseUrl"
+    )
+    parser.add_argument(
+        "--users",
+        type=int,
+        default=10,
+        help="Виртуальных пользователей; с --rate — предел одновременных "
+        "проходов",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="Открытая модель: новых проходов сценария в секунду",
+    )
+    parser.add_argument("--duration", type=float, default=30, help="Секунд")
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        help="Проходов на виртуального пользователя (закрытая модель)",
+    )
+    parser.add_argument(
+        "--ramp-up", type=float, default=0, help="Разгон, секунд"
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0,
+        help="Пауза между запросами, секунд",
+    )
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="Пропускать запросы и папки, в пути которых есть подстрока, "
+        "например bad_requests",
+    )
+    parser.add_argument(
+        "--histograms", action="store_true", help="Печатать гистограммы"
+    )
+    parser.add_argument("--output", help="Сохранить отчет в JSON")
+    parser.add_argument("--seed", type=int, help="Зерно для --rate")
+    options = parser.parse_args(argv)
+    if options.users < 1:
+        parser.error("--users должен быть положительным")
+    if options.rate is not None and options.rate <= 0:
+        parser.error("--rate должен быть положительным")
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    random.seed(options.seed)
+    variables, steps = load_collection(options.collection, options.exclude)
+    if not steps:
+        sys.exit("В коллекции не осталось запросов")
+    stats = Stats()
+    run_id = uuid.uuid4().hex[:6]
+    model = open_model if options.rate else closed_model
+    started = time.perf_counter()
+    asyncio.run(model(options, variables, steps, stats, run_id))
+    elapsed = time.perf_counter() - started
+    requests = stats.summary(elapsed)
+    if not requests:
+        sys.exit("Не выполнено ни одного запроса")
+    count = sum(result["count"] for result in requests.values())
+    errors = sum(result["errors"] for result in requests.values())
+    report = {
+        "options": vars(options),
+        "elapsed_s": round(elapsed, 3),
+        "flows": dict(stats.flows),
+        "total": {
+            "count": count,
+            "rps": round(count / elapsed, 2),
+            "errors": errors,
+            "error_rate": round(errors / count, 4),
+        },
+        "requests": requests,
+    }
+    print_report(report, options.histograms)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()